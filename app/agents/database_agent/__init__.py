@@ -1,4 +1,4 @@
 # app/agents/database_agent/__init__.py
-from .agent import DatabaseAgent
+from .agent import DatabaseAgent, get_agent
 
-__all__ = ['DatabaseAgent']
+__all__ = ['DatabaseAgent', 'get_agent']
@@ -0,0 +1,205 @@
+import os
+import uuid
+import orjson
+import asyncio
+import logging
+import threading
+import weakref
+import contextlib
+from typing import Dict, Any, Optional, Tuple
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Sessions idle for longer than this are dropped from Redis
+CONVERSATION_TTL = int(os.getenv("CONVERSATION_TTL", 24 * 60 * 60))  # seconds
+# Decoded copies kept in-process in front of Redis
+CONVERSATION_L1_SIZE = 1024
+CONVERSATION_L1_TTL = int(os.getenv("CONVERSATION_L1_TTL", 300))  # seconds
+# Cross-worker turn lock: held for at most LOCK_TIMEOUT (a crashed worker's lock expires),
+# waited on for at most LOCK_WAIT before the turn gives up
+CONVERSATION_LOCK_TIMEOUT = float(os.getenv("CONVERSATION_LOCK_TIMEOUT", 120))  # seconds
+CONVERSATION_LOCK_WAIT = float(os.getenv("CONVERSATION_LOCK_WAIT", 30))  # seconds
+
+class ConversationConflict(Exception):
+    """Another worker saved or deleted the session since this turn loaded it"""
+
+class ConversationStore:
+    """Per-session DatabaseAgent state: an in-process TTL cache (L1) in front of Redis (L2).
+
+    Without a Redis URL the L1 cache is the only tier and keeps sessions for
+    CONVERSATION_TTL. With Redis, each session has a version counter next to its state.
+    A turn holds the session's Redis lock (`lock`), loads with `aload` (one GET of the
+    version; the L1 copy is used only when its version matches) and saves with `asave`,
+    which writes only if the version is still the one it loaded (WATCH/MULTI).
+    """
+    def __init__(self, redis_url: Optional[str] = None):
+        self._redis = None
+        if redis_url:
+            import redis.asyncio as redis
+
+            self._redis = redis.from_url(redis_url)
+            self._watch_error = redis.WatchError
+            self._local = TTLCache(maxsize=CONVERSATION_L1_SIZE, ttl=CONVERSATION_L1_TTL)
+        else:
+            self._local = TTLCache(maxsize=CONVERSATION_L1_SIZE, ttl=CONVERSATION_TTL)
+        self._thread_ids = TTLCache(maxsize=CONVERSATION_L1_SIZE, ttl=self._local.ttl)
+        self._local_lock = threading.Lock()
+        self._session_locks = weakref.WeakValueDictionary()
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"conversation:{session_id}"
+
+    @staticmethod
+    def _version_key(session_id: str) -> str:
+        return f"conversation:{session_id}:version"
+
+    def _local_lock_for(self, session_id: str) -> asyncio.Lock:
+        with self._local_lock:
+            lock = self._session_locks.get(session_id)
+            if lock is None:
+                lock = asyncio.Lock()
+                self._session_locks[session_id] = lock
+            return lock
+
+    @contextlib.asynccontextmanager
+    async def lock(self, session_id: str):
+        """Serialize turns of one session: in this process, and across workers with Redis"""
+        async with self._local_lock_for(session_id):
+            if self._redis is None:
+                yield
+                return
+
+            redis_lock = self._redis.lock(
+                f"{self._key(session_id)}:lock",
+                timeout=CONVERSATION_LOCK_TIMEOUT,
+                blocking_timeout=CONVERSATION_LOCK_WAIT,
+            )
+            try:
+                acquired = await redis_lock.acquire()
+            except Exception as e:
+                # Redis is down: asave cannot write either, so nothing can be clobbered
+                logger.error("Error locking conversation %s: %s", session_id, e)
+                acquired = None
+            if acquired is False:
+                raise TimeoutError(f"Conversation {session_id} is busy in another worker")
+            try:
+                yield
+            finally:
+                if acquired:
+                    try:
+                        await redis_lock.release()
+                    except Exception as e:
+                        # Expired mid-turn; asave's version check already kept the state consistent
+                        logger.warning("Error unlocking conversation %s: %s", session_id, e)
+
+    async def aload(self, session_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[int]]:
+        """(state, version) of a session; (None, 0) for a new session.
+
+        The version is None when Redis could not be read; `asave` then keeps the turn
+        in-process only instead of overwriting a state it never saw.
+        """
+        with self._local_lock:
+            entry = self._local.get(session_id)
+        if self._redis is None:
+            return entry if entry is not None else (None, 0)
+
+        try:
+            raw_version = await self._redis.get(self._version_key(session_id))
+            version = int(raw_version or 0)
+            if entry is not None and entry[1] == version:
+                return entry
+            raw = await self._redis.get(self._key(session_id)) if version else None
+        except Exception as e:
+            logger.error("Error loading conversation %s: %s", session_id, e)
+            return (entry[0] if entry is not None else None), None
+
+        state = orjson.loads(raw) if raw is not None else None
+        with self._local_lock:
+            self._local[session_id] = (state, version)
+        return state, version
+
+    async def asave(self, session_id: str, state: Dict[str, Any], version: Optional[int]) -> None:
+        """Store a turn's state if the session is still at `version`.
+
+        Raises ConversationConflict (and drops the L1 copy) when another worker wrote or
+        deleted the session in between, so that turn is not silently overwritten.
+        """
+        if self._redis is None:
+            with self._local_lock:
+                self._local[session_id] = (state, (version or 0) + 1)
+            return
+        if version is None:
+            logger.error("Not saving conversation %s: its stored version is unknown", session_id)
+            return
+
+        key, version_key = self._key(session_id), self._version_key(session_id)
+        try:
+            async with self._redis.pipeline(transaction=True) as pipe:
+                await pipe.watch(version_key)
+                current = int(await pipe.get(version_key) or 0)
+                if current == version:
+                    pipe.multi()
+                    pipe.set(key, orjson.dumps(state, default=str), ex=CONVERSATION_TTL)
+                    pipe.set(version_key, version + 1, ex=CONVERSATION_TTL)
+                    await pipe.execute()
+        except self._watch_error:
+            current = None  # changed between WATCH and EXEC
+        except Exception as e:
+            logger.error("Error saving conversation %s: %s", session_id, e)
+            with self._local_lock:
+                self._local.pop(session_id, None)
+            return
+
+        with self._local_lock:
+            if current != version:
+                self._local.pop(session_id, None)
+            else:
+                self._local[session_id] = (state, version + 1)
+        if current != version:
+            raise ConversationConflict(f"Conversation {session_id} changed in another worker; this turn was not saved")
+
+    async def athread_id(self, session_id: str) -> str:
+        """Thread id for a session, created on first use and shared by every worker via Redis"""
+        with self._local_lock:
+            thread_id = self._thread_ids.get(session_id)
+        if thread_id is not None:
+            return thread_id
+
+        thread_id = uuid.uuid4().hex
+        if self._redis is not None:
+            key = f"thread:{session_id}:id"
+            try:
+                # SET NX: the first worker's id wins; everyone reads it back
+                await self._redis.set(key, thread_id, nx=True, ex=CONVERSATION_TTL)
+                raw = await self._redis.get(key)
+                if raw is not None:
+                    thread_id = raw.decode()
+            except Exception as e:
+                logger.error("Error loading thread id %s: %s", session_id, e)
+        with self._local_lock:
+            return self._thread_ids.setdefault(session_id, thread_id)
+
+    async def adelete(self, session_id: str) -> None:
+        """Forget a session in both tiers (call it under `lock`)"""
+        with self._local_lock:
+            self._local.pop(session_id, None)
+        if self._redis is None:
+            return
+        try:
+            # Dropping the version too makes any turn that loaded the old state fail its save
+            await self._redis.delete(self._key(session_id), self._version_key(session_id))
+        except Exception as e:
+            logger.error("Error deleting conversation %s: %s", session_id, e)
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+def get_conversation_store() -> ConversationStore:
+    """Process-wide store, backed by Redis when REDIS_URL is set"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ConversationStore(os.getenv("REDIS_URL"))
+        return _default_store
@@ -0,0 +1,48 @@
+import os
+import time
+import logging
+import gradio as gr
+
+from .agent import get_agent
+
+logger = logging.getLogger(__name__)
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Gradio Interface
+# ──────────────────────────────────────────────────────────────────────────────
+
+# Handlers are async: launch with demo.queue() so Gradio runs them on its event loop
+
+# Append the "⏱️ Response time" footer to chat replies (set SHOW_RESPONSE_TIME=0 to hide it)
+SHOW_RESPONSE_TIME = os.getenv("SHOW_RESPONSE_TIME", "1") != "0"
+
+async def chat_interface(message, history, request: gr.Request):
+    """Gradio chat interface function (one agent per browser session).
+
+    Yields the reply so far as tokens arrive; Gradio re-renders each yielded string.
+    """
+    start = time.perf_counter_ns()
+    log_info = logger.isEnabledFor(logging.INFO)
+    if log_info:
+        logger.info("\n\n\n")
+        logger.info("📥 User message received: '%s...' (length: %d)", message[:150], len(message))
+
+    response = ""
+    async for delta in get_agent(request.session_hash).astream_message(message):
+        response += delta
+        yield response
+
+    if not (log_info or SHOW_RESPONSE_TIME):
+        return
+
+    response_time = (time.perf_counter_ns() - start) / 1e9
+    if log_info:
+        logger.info("📤 Response generated (time: %.3fs, length: %d)", response_time, len(response))
+    if SHOW_RESPONSE_TIME:
+        yield f"{response}\n\n⏱️ *Response time: {response_time:.2f}s*"
+
+async def reset_conversation(request: gr.Request):
+    """Reset the conversation (waits for a reply still being generated)"""
+    response = await get_agent(request.session_hash).areset()
+    logger.info("✅ Conversation reset")
+    return "", [], response
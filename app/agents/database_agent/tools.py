@@ -1,20 +1,29 @@
 import os
 import json
+import orjson
 import time
 import logging
+import heapq
+import functools
+import numpy as np
 from typing import Dict, Any, List, Optional, Literal
 from datetime import datetime, date, timedelta
 from sqlalchemy import create_engine, Column, Integer, String, Text, Date, DateTime, ForeignKey, func, text, inspect, ARRAY, CheckConstraint, Boolean
+from sqlalchemy import select, bindparam, literal, cast, null, union_all
 from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import declarative_base, sessionmaker
 from sqlalchemy.types import Enum
 from dotenv import load_dotenv
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
-from fuzzywuzzy import fuzz, process
+from rapidfuzz import fuzz, process
+from psycopg2.errors import UndefinedFunction, UndefinedObject
 
-from .db_model import Base, User, Client, Goal, Project, Task, Milestone, Asset, Briefing, MeetingTranscript, SessionLocal
-from .utils import get_session, serialize_record, parse_date_string, parse_array_field, validate_field_value, MODEL_MAP, VALID_STATUS
+from app.utils.csv_appender import CsvAppender
+
+from .db_model import Base, User, Client, Goal, Project, Task, Milestone, Asset, Briefing, MeetingTranscript, SessionLocal, run_db, in_unnest, OPEN_TASK_STATUSES
+from .utils import unit_of_work, get_record_by_id, invalidate_record, invalidate_table, cache_generation, list_cache_key, get_cached_list, cache_list, get_cached_briefing, cache_briefing, invalidate_briefing, serialize_record, parse_date_string, parse_array_field, validate_field_value, validate_fields, MODEL_MAP, VALID_STATUS
 
 # Load environment variables
 load_dotenv()
@@ -22,6 +31,49 @@ load_dotenv()
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Filter keys parsed as dates in list_records
+_DATE_FIELDS = frozenset(['deadline', 'due_date', 'meeting_date', 'date_completed'])
+
+def _parse_date_value(value):
+    return parse_date_string(str(value))
+
+def _column_parser(column):
+    """Conversion applied to tool input for a column, or None to pass the value through"""
+    if isinstance(column.type, ARRAY):
+        return parse_array_field
+    if isinstance(column.type, (Date, DateTime)):
+        return _parse_date_value
+    return None
+
+# Per model: column key -> conversion of tool input, from the column types. Built once;
+# keys not listed pass through unchanged
+_FIELD_PARSERS = {
+    model_class: {
+        column.key: parser
+        for column in model_class.__table__.columns
+        if (parser := _column_parser(column)) is not None
+    }
+    for model_class in MODEL_MAP.values()
+}
+
+def _process_fields(model_class, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert tool input to column values: one dict lookup per key"""
+    parsers = _FIELD_PARSERS[model_class]
+    return {key: parsers[key](value) if key in parsers else value for key, value in data.items()}
+
+class _InvalidTable(KeyError):
+    """Raised by _resolve_model for a table name not in MODEL_MAP"""
+
+# Built once; every invalid-table error reuses it
+_VALID_TABLES_MSG = f"Valid tables: {list(MODEL_MAP)}"
+
+def _resolve_model(table: str):
+    """Return the model class for a table name, or raise _InvalidTable"""
+    model_class = MODEL_MAP.get(table)
+    if model_class is None:
+        raise _InvalidTable(table)
+    return model_class
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Pydantic Models for Tool Inputs/Outputs
 # ──────────────────────────────────────────────────────────────────────────────
@@ -88,10 +140,12 @@ def create_record(table: str, data: Dict[str, Any]) -> Dict[str, Any]:
     """Create a new record in the specified table"""
     try:
         # Validate table name
-        if table not in MODEL_MAP:
+        try:
+            model_class = _resolve_model(table)
+        except _InvalidTable as e:
             return {
                 "success": False,
-                "error": f"Invalid table name: {table}. Valid tables: {list(MODEL_MAP.keys())}"
+                "error": f"Invalid table name: {e.args[0]}. {_VALID_TABLES_MSG}"
             }
         
         # Check if name is provided and not empty
@@ -119,31 +173,24 @@ def create_record(table: str, data: Dict[str, Any]) -> Dict[str, Any]:
             }
         
         # Process data
-        processed_data = {}
-        for key, value in data.items():
-            if key in ['deadline', 'due_date', 'meeting_date', 'date_completed']:
-                processed_data[key] = parse_date_string(str(value))
-            elif key in ['tags', 'project_id', 'client_id', 'task_id', 'milestone_id', 'asset_id', 'briefing_id', 'meeting_transcript_id', 'goal_id', 'owner_id', 'assigned_to_id']:
-                processed_data[key] = parse_array_field(value)
-            else:
-                processed_data[key] = value
+        processed_data = _process_fields(model_class, data)
         
         # Create record
-        session = get_session()
-        try:
-            model_class = MODEL_MAP[table]
-            new_record = model_class(**processed_data)
-            session.add(new_record)
+        with unit_of_work() as session:
+            # Core ignores unknown keys, so reject them as the model constructor used to
+            unknown = [key for key in processed_data if key not in model_class.__table__.c]
+            if unknown:
+                raise ValueError(f"Invalid fields for {table}: {unknown}")
+            # INSERT ... RETURNING id: one round trip, no ORM flush / refresh
+            record_id = session.execute(model_class._INSERT, processed_data).scalar_one()
             session.commit()
-            record_id = new_record.id
+            invalidate_table(model_class)
             
             return {
                 "success": True,
                 "record_id": record_id,
                 "message": f"Successfully created {table} record with ID {record_id}"
             }
-        finally:
-            session.close()
             
     except Exception as e:
         logger.error(f"Error creating record: {str(e)}")
@@ -156,16 +203,16 @@ def create_record(table: str, data: Dict[str, Any]) -> Dict[str, Any]:
 def read_record(table: str, record_id: int) -> Dict[str, Any]:
     """Read a specific record by ID"""
     try:
-        if table not in MODEL_MAP:
+        try:
+            model_class = _resolve_model(table)
+        except _InvalidTable as e:
             return {
                 "success": False,
-                "error": f"Invalid table name: {table}. Valid tables: {list(MODEL_MAP.keys())}"
+                "error": f"Invalid table name: {e.args[0]}. {_VALID_TABLES_MSG}"
             }
         
-        session = get_session()
-        try:
-            model_class = MODEL_MAP[table]
-            record = session.query(model_class).filter(model_class.id == record_id).first()
+        with unit_of_work() as session:
+            record = get_record_by_id(session, model_class, record_id)
             
             if not record:
                 return {
@@ -175,11 +222,9 @@ def read_record(table: str, record_id: int) -> Dict[str, Any]:
             
             return {
                 "success": True,
-                "record": serialize_record(record),
+                "record": record,
                 "message": f"Successfully retrieved {table} record with ID {record_id}"
             }
-        finally:
-            session.close()
             
     except Exception as e:
         logger.error(f"Error reading record: {str(e)}")
@@ -192,61 +237,57 @@ def read_record(table: str, record_id: int) -> Dict[str, Any]:
 def update_record(table: str, record_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
     """Update an existing record"""
     try:
-        if table not in MODEL_MAP:
+        try:
+            model_class = _resolve_model(table)
+        except _InvalidTable as e:
             return {
                 "success": False,
-                "error": f"Invalid table name: {table}. Valid tables: {list(MODEL_MAP.keys())}"
+                "error": f"Invalid table name: {e.args[0]}. {_VALID_TABLES_MSG}"
             }
         
-        session = get_session()
-        try:
-            model_class = MODEL_MAP[table]
-            record = session.query(model_class).filter(model_class.id == record_id).first()
+        # Validate field values (only fields with validation rules are checked)
+        invalid = validate_fields(table, data)
+        if invalid:
+            field, value, validation_result = invalid
+            return {
+                "success": False,
+                "requires_field_confirmation": True,
+                "pending_table": table,
+                "pending_record_id": record_id,
+                "pending_data": data,
+                "field": field,
+                "user_value": value,
+                "suggested_value": validation_result['suggested_value'],
+                "message": f"⚠️ Invalid {field} value: '{value}'. Did you mean '{validation_result['suggested_value']}'?"
+            }
+        
+        # Process data
+        processed_data = _process_fields(model_class, data)
+        # Core would silently skip unknown keys; report them instead
+        unknown = [key for key in processed_data if key not in model_class.__table__.c]
+        if unknown:
+            raise ValueError(f"Invalid fields for {table}: {unknown}")
+        
+        with unit_of_work() as session:
+            # UPDATE ... WHERE id = :_id: one round trip, no row fetch or ORM dirty tracking
+            if processed_data:
+                found = session.execute(model_class._UPDATE_BY_ID, {**processed_data, "_id": record_id}).rowcount > 0
+            else:
+                found = session.get(model_class, record_id) is not None
             
-            if not record:
+            if not found:
                 return {
                     "success": False,
                     "error": f"No {table} record found with ID {record_id}"
                 }
             
-            # Validate field values
-            for field, value in data.items():
-                validation_result = validate_field_value(table, field, str(value))
-                if not validation_result['is_valid']:
-                    return {
-                        "success": False,
-                        "requires_field_confirmation": True,
-                        "pending_table": table,
-                        "pending_record_id": record_id,
-                        "pending_data": data,
-                        "field": field,
-                        "user_value": str(value),
-                        "suggested_value": validation_result['suggested_value'],
-                        "message": f"⚠️ Invalid {field} value: '{value}'. Did you mean '{validation_result['suggested_value']}'?"
-                    }
-            
-            # Process data
-            processed_data = {}
-            for key, value in data.items():
-                if key in ['deadline', 'due_date', 'meeting_date', 'date_completed']:
-                    processed_data[key] = parse_date_string(str(value))
-                elif key in ['tags', 'project_id', 'client_id', 'task_id', 'milestone_id', 'asset_id', 'briefing_id', 'meeting_transcript_id', 'goal_id', 'owner_id', 'assigned_to_id']:
-                    processed_data[key] = parse_array_field(value)
-                else:
-                    processed_data[key] = value
-            
-            # Update record
-            for key, value in processed_data.items():
-                setattr(record, key, value)
-            
             session.commit()
+            invalidate_record(model_class, record_id)
             
             return {
                 "success": True,
                 "message": f"Successfully updated {table} record with ID {record_id}"
             }
-        finally:
-            session.close()
             
     except Exception as e:
         logger.error(f"Error updating record: {str(e)}")
@@ -255,38 +296,74 @@ def update_record(table: str, record_id: int, data: Dict[str, Any]) -> Dict[str,
             "error": f"Failed to update record: {str(e)}"
         }
 
+def _coerce_list_filters(model_class, filters: Dict[str, Any]) -> Dict[str, Any]:
+    """Column name -> bound value for list_records; unknown keys and unparseable dates are dropped"""
+    params = {}
+    for key, value in filters.items():
+        if key not in model_class.__table__.c:
+            continue
+        if isinstance(value, str) and key in _DATE_FIELDS:
+            value = parse_date_string(value)
+            if not value:
+                continue
+        elif key in model_class._ARRAY_COLUMNS:
+            value = parse_array_field(value)
+        params[key] = value
+    return params
+
+@functools.lru_cache(maxsize=256)
+def _build_list_stmt(model_class, filter_keys: tuple):
+    """SELECT for list_records with one named bind per filter (f_<key>) and a bound LIMIT (lim).
+
+    `filter_keys` is a sorted tuple of (key, is_null); the same filter shape reuses the
+    same statement object, so SQLAlchemy's compiled cache is hit on every repeat.
+    """
+    stmt = select(model_class)
+    for key, is_null in filter_keys:
+        column = model_class.__table__.c[key]
+        if is_null:
+            stmt = stmt.where(column.is_(None))
+        elif key in model_class._ARRAY_COLUMNS:
+            # Relation arrays: match records containing the id(s) (`@>`, uses the GIN index)
+            stmt = stmt.where(column.contains(bindparam(f"f_{key}", type_=column.type)))
+        else:
+            stmt = stmt.where(column == bindparam(f"f_{key}"))
+    return stmt.limit(bindparam("lim"))
+
 @tool("list_records", args_schema=ListRecordsInput, return_direct=False)
 def list_records(table: str, limit: int = 10, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """List records with optional filtering"""
     try:
-        if table not in MODEL_MAP:
+        try:
+            model_class = _resolve_model(table)
+        except _InvalidTable as e:
             return {
                 "success": False,
-                "error": f"Invalid table name: {table}. Valid tables: {list(MODEL_MAP.keys())}"
+                "error": f"Invalid table name: {e.args[0]}. {_VALID_TABLES_MSG}"
             }
         
         if limit > 100:
             limit = 100
         
-        session = get_session()
-        try:
-            model_class = MODEL_MAP[table]
-            query = session.query(model_class)
-            
-            # Apply filters
-            if filters:
-                for key, value in filters.items():
-                    if hasattr(model_class, key):
-                        if isinstance(value, str) and key in ['deadline', 'due_date', 'meeting_date', 'date_completed']:
-                            # Handle date filtering
-                            date_value = parse_date_string(value)
-                            if date_value:
-                                query = query.filter(getattr(model_class, key) == date_value)
-                        else:
-                            query = query.filter(getattr(model_class, key) == value)
-            
-            records = query.limit(limit).all()
+        cache_key = list_cache_key(table, limit, filters)
+        generation = cache_generation()
+        serialized_records = get_cached_list(cache_key)
+        if serialized_records is not None:
+            return {
+                "success": True,
+                "records": serialized_records,
+                "count": len(serialized_records),
+                "message": f"Retrieved {len(serialized_records)} {table} records"
+            }
+        
+        # Coerce filter values before building the statement
+        params = _coerce_list_filters(model_class, filters) if filters else {}
+        stmt = _build_list_stmt(model_class, tuple(sorted((key, params[key] is None) for key in params)))
+        
+        with unit_of_work() as session:
+            records = session.execute(stmt, {**{f"f_{key}": value for key, value in params.items() if value is not None}, "lim": limit}).scalars().all()
             serialized_records = [serialize_record(record) for record in records]
+            cache_list(cache_key, serialized_records, generation)
             
             return {
                 "success": True,
@@ -294,8 +371,6 @@ def list_records(table: str, limit: int = 10, filters: Optional[Dict[str, Any]]
                 "count": len(serialized_records),
                 "message": f"Retrieved {len(serialized_records)} {table} records"
             }
-        finally:
-            session.close()
             
     except Exception as e:
         logger.error(f"Error listing records: {str(e)}")
@@ -308,16 +383,16 @@ def list_records(table: str, limit: int = 10, filters: Optional[Dict[str, Any]]
 def delete_record(table: str, record_id: int) -> Dict[str, Any]:
     """Delete a record by ID"""
     try:
-        if table not in MODEL_MAP:
+        try:
+            model_class = _resolve_model(table)
+        except _InvalidTable as e:
             return {
                 "success": False,
-                "error": f"Invalid table name: {table}. Valid tables: {list(MODEL_MAP.keys())}"
+                "error": f"Invalid table name: {e.args[0]}. {_VALID_TABLES_MSG}"
             }
         
-        session = get_session()
-        try:
-            model_class = MODEL_MAP[table]
-            record = session.query(model_class).filter(model_class.id == record_id).first()
+        with unit_of_work() as session:
+            record = session.get(model_class, record_id)
             
             if not record:
                 return {
@@ -327,13 +402,12 @@ def delete_record(table: str, record_id: int) -> Dict[str, Any]:
             
             session.delete(record)
             session.commit()
+            invalidate_record(model_class, record_id)
             
             return {
                 "success": True,
                 "message": f"Successfully deleted {table} record with ID {record_id}"
             }
-        finally:
-            session.close()
             
     except Exception as e:
         logger.error(f"Error deleting record: {str(e)}")
@@ -342,16 +416,27 @@ def delete_record(table: str, record_id: int) -> Dict[str, Any]:
             "error": f"Failed to delete record: {str(e)}"
         }
 
+# All table counts in one round trip: SELECT (SELECT count(*) FROM users) AS users, ...
+_STATS_STMT = select(*[
+    select(func.count()).select_from(model_class).scalar_subquery().label(table_name)
+    for table_name, model_class in MODEL_MAP.items()
+])
+# Planner estimates from the catalog (kept current by autovacuum/ANALYZE), no table scans
+_APPROX_STATS_STMT = text(
+    "SELECT relname, reltuples::bigint FROM pg_class WHERE relkind = 'r' AND relname = ANY(:names)"
+).bindparams(names=list(MODEL_MAP))
+
 @tool("get_database_stats", return_direct=False)
-def get_database_stats() -> Dict[str, Any]:
-    """Get database statistics and overview"""
+def get_database_stats(fast: bool = False) -> Dict[str, Any]:
+    """Get database statistics and overview (fast=True returns approximate counts)"""
     try:
-        session = get_session()
-        try:
-            stats = {}
-            for table_name, model_class in MODEL_MAP.items():
-                count = session.query(model_class).count()
-                stats[table_name] = count
+        with unit_of_work() as session:
+            if fast:
+                estimates = dict(session.execute(_APPROX_STATS_STMT).all())
+                # reltuples is -1 for a table that was never vacuumed or analyzed
+                stats = {table_name: max(int(estimates.get(table_name, 0)), 0) for table_name in MODEL_MAP}
+            else:
+                stats = dict(session.execute(_STATS_STMT).one()._mapping)
             
             total_records = sum(stats.values())
             
@@ -361,8 +446,6 @@ def get_database_stats() -> Dict[str, Any]:
                 "total_records": total_records,
                 "message": f"Database contains {total_records} total records across {len(MODEL_MAP)} tables"
             }
-        finally:
-            session.close()
             
     except Exception as e:
         logger.error(f"Error getting database stats: {str(e)}")
@@ -371,49 +454,125 @@ def get_database_stats() -> Dict[str, Any]:
             "error": f"Failed to get database stats: {str(e)}"
         }
 
+# Trigram prefilter for search_records_by_name (pg_trgm + the name indexes from db_model);
+# switched off for the process if the extension is missing (its operator or function is undefined)
+_trigram_search = os.getenv("TRIGRAM_SEARCH", "1") != "0"
+
+# Names are streamed from a server-side cursor and scored this many at a time
+_NAME_SCAN_CHUNK = 1000
+
+# Chunks at least this large are scored with process.cdist across all cores (GIL released);
+# below it the thread-pool start-up costs more than it saves
+_PARALLEL_SCORE_MIN = 4096
+
+def _substring_probe(session, model_class, name_query: str, limit: int):
+    """Up to `limit` records whose name contains the query (case-insensitive), or None if fewer.
+
+    partial_ratio scores every such name 100, so when there are `limit` of them they are the
+    result and no name needs scoring. ILIKE '%query%' is served by the trigram GIN index,
+    which needs at least 3 characters to narrow anything.
+    """
+    if not _trigram_search or limit <= 0 or len(name_query.strip()) < 3:
+        return None
+    escaped = name_query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    stmt = select(model_class).where(model_class.name.ilike(f"%{escaped}%", escape="\\")).limit(limit)
+    try:
+        records = session.execute(stmt).scalars().all()
+    except DBAPIError as e:
+        session.rollback()
+        logger.warning("Name substring probe failed, falling back to fuzzy search: %s", e)
+        return None
+    return records if len(records) >= limit else None
+
+def _rank_names(partitions, name_query: str, limit: int) -> List[tuple]:
+    """Best `limit` (name, score, id) matches, keeping only one chunk of names in memory"""
+    # Case-fold the query once and each name once; RapidFuzz then compares as-is (processor=None).
+    # casefold also matches e.g. "ß" / "ss", which lower() does not
+    query = name_query.casefold()
+    top = []
+    for rows in partitions:
+        names = {record_id: name for record_id, name in rows if name}
+        choices = {record_id: name.casefold() for record_id, name in names.items()}
+        if len(choices) >= _PARALLEL_SCORE_MIN:
+            ids = list(choices)
+            scores = process.cdist([query], list(choices.values()), scorer=fuzz.partial_ratio, processor=None, dtype=np.float64, workers=-1)[0]
+            best = np.argpartition(scores, -limit)[-limit:] if len(ids) > limit else range(len(ids))
+            ranked = [(names[ids[i]], float(scores[i]), ids[i]) for i in best]
+        else:
+            ranked = [
+                (names[record_id], score, record_id)
+                for _, score, record_id in process.extract(query, choices, scorer=fuzz.partial_ratio, processor=None, limit=limit)
+            ]
+        top = heapq.nlargest(limit, top + ranked, key=lambda match: match[1])
+    return top
+
+def _search_names(session, model_class, name_query: str, limit: int, min_similarity: int, keep: int) -> List[tuple]:
+    """Best `keep` (name, score, id) matches, scoring trigram-similar names first.
+
+    The whole table is scored when the prefilter yields fewer than `limit` names that reach
+    min_similarity: word_similarity and partial_ratio disagree at the edges, so a short
+    candidate list does not mean the table has no more matches.
+    """
+    global _trigram_search
+    stmt = select(model_class.id, model_class.name).where(model_class.name.isnot(None))
+    if _trigram_search:
+        try:
+            # word_similarity runs lower than partial_ratio for the same pair, so the SQL
+            # threshold is looser and RapidFuzz still makes the final call
+            session.execute(select(func.set_config('pg_trgm.word_similarity_threshold', str(min_similarity / 200), True)))
+            candidates = session.execute(stmt.where(model_class.name.op('%>')(name_query))).all()
+            if candidates:
+                ranked = _rank_names([candidates], name_query, keep)
+                if sum(score >= min_similarity for _, score, _ in ranked) >= limit:
+                    return ranked
+        except DBAPIError as e:
+            session.rollback()
+            if isinstance(e.orig, (UndefinedFunction, UndefinedObject)):
+                _trigram_search = False
+                logger.warning("Trigram name search unavailable, scanning all names: %s", e)
+            else:
+                logger.warning("Trigram name prefilter failed, scanning all names: %s", e)
+    # Score everything, so both matches and suggestions come from the whole table
+    return _rank_names(session.execute(stmt.execution_options(yield_per=_NAME_SCAN_CHUNK)).partitions(), name_query, keep)
+
 @tool("search_records_by_name", args_schema=SearchRecordsInput, return_direct=False)
 def search_records_by_name(table: str, name_query: str, limit: int = 10, min_similarity: int = 60) -> Dict[str, Any]:
     """Search records by name using fuzzy matching"""
     try:
-        if table not in MODEL_MAP:
+        try:
+            model_class = _resolve_model(table)
+        except _InvalidTable as e:
             return {
                 "success": False,
-                "error": f"Invalid table name: {table}. Valid tables: {list(MODEL_MAP.keys())}"
+                "error": f"Invalid table name: {e.args[0]}. {_VALID_TABLES_MSG}"
             }
         
         if limit > 100:
             limit = 100
         
-        session = get_session()
-        try:
-            model_class = MODEL_MAP[table]
-            all_records = session.query(model_class).all()
-            
-            # Perform fuzzy matching
-            matches = []
-            for record in all_records:
-                if hasattr(record, 'name') and record.name:
-                    similarity = fuzz.partial_ratio(name_query.lower(), record.name.lower())
-                    if similarity >= min_similarity:
-                        matches.append({
-                            'record': serialize_record(record),
-                            'similarity': similarity
-                        })
-            
-            # Sort by similarity score
-            matches.sort(key=lambda x: x['similarity'], reverse=True)
-            
-            # Limit results
-            limited_matches = matches[:limit]
-            records = [match['record'] for match in limited_matches]
+        with unit_of_work() as session:
+            # Common case: the query is part of at least `limit` names, which is the answer as is
+            probe = _substring_probe(session, model_class, name_query, limit)
+            if probe is not None:
+                ranked = []
+                records = [serialize_record(record) for record in probe]
+            else:
+                # Score names only; full rows are loaded just for the winners.
+                # Perform fuzzy matching (RapidFuzz per chunk, best matches first). The top
+                # entries double as suggestions when none reach min_similarity
+                ranked = _search_names(session, model_class, name_query, limit, min_similarity, max(limit, 5))
+                match_ids = [record_id for _, score, record_id in ranked if score >= min_similarity][:limit]
+                
+                records = []
+                if match_ids:
+                    # One array parameter, so the statement is the same for any number of matches
+                    by_id = {record.id: record for record in session.query(model_class).filter(in_unnest(model_class.id, match_ids))}
+                    records = [serialize_record(by_id[record_id]) for record_id in match_ids]
             
             # Generate suggestions if no good matches
             suggestions = []
-            if not records and all_records:
-                all_names = [record.name for record in all_records if hasattr(record, 'name') and record.name]
-                if all_names:
-                    suggestions = process.extract(name_query, all_names, limit=5)
-                    suggestions = [{'name': name, 'similarity': score} for name, score in suggestions]
+            if not records:
+                suggestions = [{'name': name, 'similarity': score} for name, score, _ in ranked[:5]]
             
             return {
                 "success": True,
@@ -422,8 +581,6 @@ def search_records_by_name(table: str, name_query: str, limit: int = 10, min_sim
                 "suggestions": suggestions if suggestions else None,
                 "message": f"Found {len(records)} {table} records matching '{name_query}'"
             }
-        finally:
-            session.close()
             
     except Exception as e:
         logger.error(f"Error searching records: {str(e)}")
@@ -436,14 +593,17 @@ def search_records_by_name(table: str, name_query: str, limit: int = 10, min_sim
 def get_current_datetime() -> Dict[str, Any]:
     """Get the current date and time"""
     try:
-        now = datetime.now()
+        # One aware local instant (tz looked up per call so DST changes are picked up),
+        # formatted once; the other fields are slices of "YYYY-MM-DDTHH:MM:SS.ffffff+HH:MM"
+        now = datetime.now().astimezone()
+        iso = now.isoformat(timespec='microseconds')
         return {
             "success": True,
-            "datetime": now.isoformat(),
-            "date": now.strftime("%Y-%m-%d"),
-            "time": now.strftime("%H:%M:%S"),
-            "timezone": str(now.astimezone().tzinfo),
-            "message": f"Current datetime: {now.strftime('%Y-%m-%d %H:%M:%S')}"
+            "datetime": iso[:26],
+            "date": iso[:10],
+            "time": iso[11:19],
+            "timezone": str(now.tzinfo),
+            "message": f"Current datetime: {iso[:10]} {iso[11:19]}"
         }
     except Exception as e:
         logger.error(f"Error getting current datetime: {str(e)}")
@@ -460,21 +620,20 @@ def get_current_datetime() -> Dict[str, Any]:
 def confirm_create_with_empty_name(table: str, **data) -> Dict[str, Any]:
     """Confirm creation of record with empty name"""
     try:
-        session = get_session()
-        try:
+        with unit_of_work() as session:
             model_class = MODEL_MAP[table]
-            new_record = model_class(**data)
-            session.add(new_record)
+            unknown = [key for key in data if key not in model_class.__table__.c]
+            if unknown:
+                raise ValueError(f"Invalid fields for {table}: {unknown}")
+            record_id = session.execute(model_class._INSERT, data).scalar_one()
             session.commit()
-            record_id = new_record.id
+            invalidate_table(model_class)
             
             return {
                 "success": True,
                 "record_id": record_id,
                 "message": f"Successfully created {table} record with ID {record_id} (empty name)"
             }
-        finally:
-            session.close()
             
     except Exception as e:
         logger.error(f"Error creating record with empty name: {str(e)}")
@@ -488,7 +647,7 @@ def confirm_create_with_corrected_field(table: str, data: Dict[str, Any], field:
     """Confirm creation with corrected field value"""
     try:
         data[field] = corrected_value
-        return create_record(table, data)
+        return create_record.func(table, data)
     except Exception as e:
         logger.error(f"Error creating record with corrected field: {str(e)}")
         return {
@@ -501,7 +660,7 @@ def confirm_field_correction(table: str, record_id: int, field: str, corrected_v
     """Confirm field correction for update operation"""
     try:
         data[field] = corrected_value
-        return update_record(table, record_id, data)
+        return update_record.func(table, record_id, data)
     except Exception as e:
         logger.error(f"Error updating record with corrected field: {str(e)}")
         return {
@@ -536,37 +695,21 @@ class AddReminderOutput(BaseModel):
     message: str = Field(description="Operation result message")
     error: Optional[str] = Field(description="Error message if failed")
 
+# Appended from a background thread; the file is opened (and its header written) by the first append
+_THOUGHTS_LOG = CsvAppender(os.path.join("logs", "thoughts.csv"), ['timestamp', 'thought', 'category', 'tags'])
+_REMINDERS_LOG = CsvAppender(os.path.join("logs", "reminders.csv"), ['timestamp', 'reminder_text', 'due_time', 'priority', 'category', 'status'])
+
 @tool("log_thought", args_schema=LogThoughtInput, return_direct=False)
 def log_thought(thought: str, category: str = "general", tags: Optional[List[str]] = None) -> Dict[str, Any]:
     """Log a thought, insight, or idea for future reference"""
     try:
-        import csv
-        import os
-        
-        # Create logs directory if it doesn't exist
-        logs_dir = "logs"
-        os.makedirs(logs_dir, exist_ok=True)
-        
-        # CSV file path
-        csv_file = os.path.join(logs_dir, "thoughts.csv")
-        
-        # Check if file exists to determine if we need headers
-        file_exists = os.path.exists(csv_file)
-        
         # Prepare data
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         tags_str = ", ".join(tags) if tags else ""
         
-        # Write to CSV
-        with open(csv_file, 'a', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            
-            # Write headers if file is new
-            if not file_exists:
-                writer.writerow(['timestamp', 'thought', 'category', 'tags'])
-            
-            # Write the thought
-            writer.writerow([timestamp, thought, category, tags_str])
+        # Queue the row; the writer thread appends it to logs/thoughts.csv
+        _THOUGHTS_LOG.append([timestamp, thought, category, tags_str])
+        invalidate_briefing()
         
         return {
             "success": True,
@@ -584,50 +727,29 @@ def log_thought(thought: str, category: str = "general", tags: Optional[List[str
 def add_reminder(reminder_text: str, due_time: Optional[str] = None, priority: str = "medium", category: str = "general") -> Dict[str, Any]:
     """Add a reminder for a specific time or task"""
     try:
-        import csv
-        import os
-        
-        # Create logs directory if it doesn't exist
-        logs_dir = "logs"
-        os.makedirs(logs_dir, exist_ok=True)
-        
-        # CSV file path
-        csv_file = os.path.join(logs_dir, "reminders.csv")
-        
-        # Check if file exists to determine if we need headers
-        file_exists = os.path.exists(csv_file)
+        now = datetime.now()
         
         # Parse due time if provided
         due_date_str = ""
         if due_time:
             # Simple time parsing - you can enhance this
-            if "21:30" in due_time or "9:30pm" in due_time.lower():
-                due_date = datetime.now().replace(hour=21, minute=30, second=0, microsecond=0)
-                if due_date < datetime.now():
-                    due_date = due_date.replace(day=due_date.day + 1)
-                due_date_str = due_date.strftime('%Y-%m-%d %H:%M')
-            elif "tomorrow" in due_time.lower():
-                due_date = datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
-                due_date = due_date.replace(day=due_date.day + 1)
-                due_date_str = due_date.strftime('%Y-%m-%d %H:%M')
+            due_time_lower = due_time.lower()
+            if "21:30" in due_time or "9:30pm" in due_time_lower:
+                due_date = now.replace(hour=21, minute=30, second=0, microsecond=0)
+                if due_date < now:
+                    due_date += timedelta(days=1)
+            elif "tomorrow" in due_time_lower:
+                due_date = now.replace(hour=9, minute=0, second=0, microsecond=0) + timedelta(days=1)
             else:
                 # Default to 1 hour from now if can't parse
-                due_date = datetime.now().replace(minute=datetime.now().minute + 60)
-                due_date_str = due_date.strftime('%Y-%m-%d %H:%M')
+                due_date = now + timedelta(hours=1)
+            due_date_str = due_date.strftime('%Y-%m-%d %H:%M')
         
         # Prepare data
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
         
-        # Write to CSV
-        with open(csv_file, 'a', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            
-            # Write headers if file is new
-            if not file_exists:
-                writer.writerow(['timestamp', 'reminder_text', 'due_time', 'priority', 'category', 'status'])
-            
-            # Write the reminder
-            writer.writerow([timestamp, reminder_text, due_date_str, priority, category, 'pending'])
+        # Queue the row; the writer thread appends it to logs/reminders.csv
+        _REMINDERS_LOG.append([timestamp, reminder_text, due_date_str, priority, category, 'pending'])
         
         due_info = f" for {due_date_str}" if due_date_str else ""
         return {
@@ -657,98 +779,121 @@ class MorningBriefingOutput(BaseModel):
     message: str = Field(description="Operation result message")
     error: Optional[str] = Field(description="Error message if failed")
 
+_BRIEFING_PROJECT_STATUSES = ['Not started', 'In progress']
+# Same set as the partial ix_tasks_status_due_date index, so the planner can use it
+_BRIEFING_TASK_STATUSES = list(OPEN_TASK_STATUSES)
+
+@functools.lru_cache(maxsize=None)
+def _briefing_stmt(include_today: bool, include_overdue: bool):
+    """UNION ALL of the briefing sections, each tagged with a literal `kind`.
+
+    Binds :today, :tomorrow and :now. Status columns are different enum types per
+    table, so they are cast to text to line up in the union.
+    """
+    parts = [
+        select(
+            literal('project').label('kind'), Project.id, Project.name,
+            cast(Project.status, Text).label('status'), cast(Project.priority, Text).label('priority'),
+            Project.deadline.label('date')
+        ).where(Project.status.in_(_BRIEFING_PROJECT_STATUSES)).limit(5)
+    ]
+    task_sections = []
+    if include_today:
+        task_sections.append(('today', (Task.due_date >= bindparam('today'), Task.due_date < bindparam('tomorrow'))))
+    if include_overdue:
+        task_sections.append(('overdue', (Task.due_date < bindparam('now'),)))
+    for kind, criteria in task_sections:
+        parts.append(
+            select(
+                literal(kind).label('kind'), Task.id, Task.name,
+                cast(Task.status, Text).label('status'), cast(null(), Text).label('priority'),
+                Task.due_date.label('date')
+            ).where(*criteria, Task.status.in_(_BRIEFING_TASK_STATUSES)).limit(10)
+        )
+    # Each section keeps its own LIMIT inside a subquery
+    subqueries = [part.subquery() for part in parts]
+    return union_all(*(select(*subquery.c) for subquery in subqueries))
+
+def _build_briefing(now: datetime, include_overdue: bool, include_today: bool, include_recent_thoughts: bool) -> Dict[str, Any]:
+    """Briefing sections for `now` (projects, today's and overdue tasks, recent thoughts)"""
+    with unit_of_work() as session:
+        today = now.date()
+        today_ord = today.toordinal()
+        briefing = {
+            "date": now.strftime('%Y-%m-%d'),
+            "time": now.strftime('%H:%M'),
+            "projects": [],
+            "tasks": [],
+            "overdue_tasks": [],
+            "recent_thoughts": []
+        }
+
+        # Active projects, today's tasks and overdue tasks in one round trip
+        rows = session.execute(
+            _briefing_stmt(include_today, include_overdue),
+            {"today": today, "tomorrow": today + timedelta(days=1), "now": now}
+        )
+        for row in rows:
+            if row.kind == 'project':
+                briefing["projects"].append({
+                    "id": row.id,
+                    "name": row.name,
+                    "status": row.status,
+                    "priority": row.priority,
+                    "deadline": row.date.strftime('%Y-%m-%d') if row.date else None
+                })
+            elif row.kind == 'today':
+                briefing["tasks"].append({
+                    "id": row.id,
+                    "name": row.name,
+                    "status": row.status,
+                    "due_date": row.date.strftime('%Y-%m-%d %H:%M') if row.date else None
+                })
+            else:
+                briefing["overdue_tasks"].append({
+                    "id": row.id,
+                    "name": row.name,
+                    "status": row.status,
+                    "due_date": row.date.strftime('%Y-%m-%d %H:%M') if row.date else None,
+                    "days_overdue": today_ord - row.date.toordinal() if row.date else 0
+                })
+
+    # Recent thoughts are read after the session is released: tail() waits for the CSV writer
+    if include_recent_thoughts:
+        try:
+            # Get last 5 thoughts (cached tail; includes thoughts still queued for the writer)
+            for thought in _THOUGHTS_LOG.tail(5):
+                briefing["recent_thoughts"].append({
+                    "timestamp": thought.get('timestamp', ''),
+                    "thought": thought.get('thought', ''),
+                    "category": thought.get('category', ''),
+                    "tags": thought.get('tags', '')
+                })
+        except Exception as e:
+            logger.warning(f"Could not load recent thoughts: {e}")
+    return briefing
+
 @tool("get_morning_briefing", args_schema=MorningBriefingInput, return_direct=False)
 def get_morning_briefing(include_overdue: bool = True, include_today: bool = True, include_recent_thoughts: bool = True) -> Dict[str, Any]:
     """Get a morning briefing with current projects, tasks, and recent thoughts"""
     try:
-        session = get_session()
-        try:
-            briefing = {
-                "date": datetime.now().strftime('%Y-%m-%d'),
-                "time": datetime.now().strftime('%H:%M'),
-                "projects": [],
-                "tasks": [],
-                "overdue_tasks": [],
-                "recent_thoughts": []
-            }
-            
-            # Get active projects
-            active_projects = session.query(Project).filter(
-                Project.status.in_(['Not started', 'In progress'])
-            ).limit(5).all()
-            
-            for project in active_projects:
-                briefing["projects"].append({
-                    "id": project.id,
-                    "name": project.name,
-                    "status": project.status,
-                    "priority": project.priority,
-                    "deadline": project.deadline.strftime('%Y-%m-%d') if project.deadline else None
-                })
-            
-            # Get today's tasks
-            if include_today:
-                today = datetime.now().date()
-                today_tasks = session.query(Task).filter(
-                    Task.due_date >= today,
-                    Task.due_date < today + timedelta(days=1),
-                    Task.status.in_(['Inbox', 'Next (P2)', 'Now (P1)', 'In progress'])
-                ).limit(10).all()
-                
-                for task in today_tasks:
-                    briefing["tasks"].append({
-                        "id": task.id,
-                        "name": task.name,
-                        "status": task.status,
-                        "due_date": task.due_date.strftime('%Y-%m-%d %H:%M') if task.due_date else None
-                    })
-            
-            # Get overdue tasks
-            if include_overdue:
-                overdue_tasks = session.query(Task).filter(
-                    Task.due_date < datetime.now(),
-                    Task.status.in_(['Inbox', 'Next (P2)', 'Now (P1)', 'In progress'])
-                ).limit(10).all()
-                
-                for task in overdue_tasks:
-                    briefing["overdue_tasks"].append({
-                        "id": task.id,
-                        "name": task.name,
-                        "status": task.status,
-                        "due_date": task.due_date.strftime('%Y-%m-%d %H:%M') if task.due_date else None,
-                        "days_overdue": (datetime.now().date() - task.due_date.date()).days if task.due_date else 0
-                    })
-            
-            # Get recent thoughts
-            if include_recent_thoughts:
-                try:
-                    import csv
-                    thoughts_file = "logs/thoughts.csv"
-                    if os.path.exists(thoughts_file):
-                        with open(thoughts_file, 'r', encoding='utf-8') as file:
-                            reader = csv.DictReader(file)
-                            thoughts = list(reader)
-                            # Get last 5 thoughts
-                            recent_thoughts = thoughts[-5:] if len(thoughts) > 5 else thoughts
-                            
-                            for thought in recent_thoughts:
-                                briefing["recent_thoughts"].append({
-                                    "timestamp": thought.get('timestamp', ''),
-                                    "thought": thought.get('thought', ''),
-                                    "category": thought.get('category', ''),
-                                    "tags": thought.get('tags', '')
-                                })
-                except Exception as e:
-                    logger.warning(f"Could not load recent thoughts: {e}")
-            
-            return {
-                "success": True,
-                "briefing": briefing,
-                "message": f"Morning briefing generated for {briefing['date']}"
-            }
-        finally:
-            session.close()
-            
+        now = datetime.now()
+        key = (now.date(), include_overdue, include_today, include_recent_thoughts)
+        generation = cache_generation()
+        briefing = get_cached_briefing(key)
+        if briefing is None:
+            briefing = _build_briefing(now, include_overdue, include_today, include_recent_thoughts)
+            cache_briefing(key, briefing, generation)
+        else:
+            # Sections may be up to BRIEFING_CACHE_TTL old; the clock is not
+            briefing = {**briefing, "time": now.strftime('%H:%M')}
+
+        return {
+            "success": True,
+            "briefing": briefing,
+            "message": f"Morning briefing generated for {briefing['date']}"
+        }
+
     except Exception as e:
         logger.error(f"Error generating morning briefing: {str(e)}")
         return {
@@ -756,3 +901,19 @@ def get_morning_briefing(include_overdue: bool = True, include_today: bool = Tru
             "error": f"Failed to generate morning briefing: {str(e)}"
         }
 
+async def _run_db_json(func, *args, **kwargs) -> str:
+    """Run a tool function on the DB executor and return its result as JSON text.
+
+    Encoding with orjson here means LangChain uses the string as the ToolMessage
+    content as-is instead of json.dumps-ing the (possibly 100-record) dict.
+    """
+    return orjson.dumps(await run_db(func, *args, **kwargs), default=str).decode()
+
+# When the agent calls these asynchronously (ToolNode.ainvoke), run them on the DB executor
+# rather than the event loop's default thread pool; .func still returns the plain dict
+for _db_tool in (
+    create_record, read_record, update_record, list_records, delete_record, get_database_stats,
+    search_records_by_name, confirm_create_with_empty_name, confirm_create_with_corrected_field,
+    confirm_field_correction, get_morning_briefing
+):
+    _db_tool.coroutine = functools.partial(_run_db_json, _db_tool.func)
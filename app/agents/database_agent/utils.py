@@ -1,8 +1,17 @@
 from .db_model import User, Client, Goal, Project, Task, Milestone, Asset, Briefing, MeetingTranscript
 from datetime import datetime, date
 from typing import Optional, List, Any
-import json
+import os
+import orjson
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from cachetools import TTLCache
+from sqlalchemy import event
+from sqlalchemy.orm import Session, scoped_session, undefer_group
+from rapidfuzz import fuzz, process
 
+from config import WEB_CONCURRENCY
 from .db_model import SessionLocal
 
 MODEL_MAP = {
@@ -47,46 +56,188 @@ VALID_STATUS = {
     }
 }
 
+# Lower-cased value -> canonical value, for the O(1) exact-match check in validate_field_value
+_VALID_LOOKUP = {
+    table: {field: {value.lower(): value for value in values} for field, values in fields.items()}
+    for table, fields in VALID_STATUS.items()
+}
+
+# Canonical value -> lower-cased value, scored as-is by the fuzzy fallback (processor=None)
+_LOWER_CHOICES = {
+    table: {field: {value: value.lower() for value in values} for field, values in fields.items()}
+    for table, fields in VALID_STATUS.items()
+}
+
+# One Session per thread; unit_of_work() hands it out and removes it when the outermost block ends
+_scoped_session = scoped_session(SessionLocal)
+
 def get_session():
     return SessionLocal()
 
+@contextmanager
+def unit_of_work():
+    """Yield this thread's Session: commit on success, roll back on error, close at the end.
+
+    Nested blocks (a tool function called from inside another unit of work) join the outer
+    one and share its session and connection instead of checking out another.
+    """
+    session = _scoped_session()
+    depth = session.info.get("uow_depth", 0)
+    session.info["uow_depth"] = depth + 1
+    try:
+        yield session
+        if depth == 0:
+            session.commit()
+    except Exception:
+        if depth == 0:
+            session.rollback()
+        raise
+    finally:
+        session.info["uow_depth"] = depth
+        if depth == 0:
+            _scoped_session.remove()
+
+def _after_commit(callback) -> None:
+    """Run `callback` once this thread's open transaction commits (never if it rolls back).
+
+    Without one, e.g. right after a tool's explicit session.commit(), it runs at once.
+    """
+    session = _scoped_session() if _scoped_session.registry.has() else None
+    if session is not None and session.in_transaction():
+        session.info.setdefault("after_commit", []).append(callback)
+    else:
+        callback()
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(session):
+    for callback in session.info.pop("after_commit", ()):
+        callback()
+
+@event.listens_for(Session, "after_rollback")
+def _drop_after_commit(session):
+    session.info.pop("after_commit", None)
+
+# Serialized records by (model, id), shared across sessions and turns. The cache is per
+# process, so it is on by default only with a single worker: another worker's write would
+# otherwise stay invisible here for up to RECORD_CACHE_TTL seconds (0 turns it off).
+# The tools invalidate after their write commits, and bump _cache_generation when they do;
+# a reader only fills the cache if no invalidation happened since it started reading, so a
+# row read before the commit cannot be cached after it
+RECORD_CACHE_TTL = int(os.getenv("RECORD_CACHE_TTL", 60 if WEB_CONCURRENCY == 1 else 0))  # seconds
+_record_cache = TTLCache(maxsize=4096, ttl=max(RECORD_CACHE_TTL, 1))
+_record_cache_lock = threading.Lock()
+_cache_generation = 0
+
+def get_record_by_id(session, model_class, record_id) -> Optional[dict]:
+    """Serialized record by primary key: cache first, then session.get (identity map first)"""
+    key = (model_class.__name__, record_id)
+    with _record_cache_lock:
+        cached = _record_cache.get(key)
+        generation = _cache_generation
+    if cached is not None:
+        return cached
+
+    options = [undefer_group('summaries')] if model_class._DEFERRED_COLUMNS else None
+    record = session.get(model_class, record_id, options=options)
+    if record is None:
+        return None
+    serialized = serialize_record(record)
+    if RECORD_CACHE_TTL > 0:
+        with _record_cache_lock:
+            if generation == _cache_generation:
+                _record_cache[key] = serialized
+    return serialized
+
+def cache_generation() -> int:
+    """Current invalidation count; take it before a read and pass it to cache_list / cache_briefing"""
+    with _record_cache_lock:
+        return _cache_generation
+
+# list_records results by (table, limit, filters), under the same lock; any write to a
+# table through the tools drops that table's entries once it commits. Per process like the
+# record cache, so off by default with more than one worker
+LIST_CACHE_TTL = int(os.getenv("LIST_CACHE_TTL", 30 if WEB_CONCURRENCY == 1 else 0))  # seconds
+_list_cache = TTLCache(maxsize=1024, ttl=max(LIST_CACHE_TTL, 1))
+
+def list_cache_key(table: str, limit: int, filters: Optional[dict]) -> tuple:
+    """Hashable key for a list_records call (filter values may be lists)"""
+    return (table, limit, orjson.dumps(filters, option=orjson.OPT_SORT_KEYS, default=str) if filters else b"")
+
+def get_cached_list(key: tuple) -> Optional[List[dict]]:
+    with _record_cache_lock:
+        return _list_cache.get(key)
+
+def cache_list(key: tuple, records: List[dict], generation: int) -> None:
+    """Cache `records`, read after cache_generation() returned `generation`, unless stale"""
+    if LIST_CACHE_TTL > 0:
+        with _record_cache_lock:
+            if generation == _cache_generation:
+                _list_cache[key] = records
+
+# get_morning_briefing results by (date, section flags). Writes to projects or tasks through
+# the tools and new thoughts drop them all; other changes show up within BRIEFING_CACHE_TTL.
+# Off by default with more than one worker, like the caches above
+BRIEFING_CACHE_TTL = int(os.getenv("BRIEFING_CACHE_TTL", 60 if WEB_CONCURRENCY == 1 else 0))  # seconds
+_BRIEFING_TABLES = ("projects", "tasks")
+_briefing_cache = TTLCache(maxsize=128, ttl=max(BRIEFING_CACHE_TTL, 1))
+
+def get_cached_briefing(key: tuple) -> Optional[dict]:
+    with _record_cache_lock:
+        return _briefing_cache.get(key)
+
+def cache_briefing(key: tuple, briefing: dict, generation: int) -> None:
+    """Cache `briefing`, built after cache_generation() returned `generation`, unless stale"""
+    if BRIEFING_CACHE_TTL > 0:
+        with _record_cache_lock:
+            if generation == _cache_generation:
+                _briefing_cache[key] = briefing
+
+def invalidate_briefing() -> None:
+    global _cache_generation
+    with _record_cache_lock:
+        _cache_generation += 1
+        _briefing_cache.clear()
+
+def invalidate_table(model_class) -> None:
+    """Drop cached list results (and briefings, for projects and tasks) once an insert, update or delete commits"""
+    table = model_class.__tablename__
+    def invalidate():
+        global _cache_generation
+        with _record_cache_lock:
+            _cache_generation += 1
+            for key in [key for key in _list_cache if key[0] == table]:
+                _list_cache.pop(key, None)
+            if table in _BRIEFING_TABLES:
+                _briefing_cache.clear()
+    _after_commit(invalidate)
+
+def invalidate_record(model_class, record_id) -> None:
+    """Drop a cached record (and its table's cached lists) once its update or delete commits"""
+    def invalidate():
+        global _cache_generation
+        with _record_cache_lock:
+            _cache_generation += 1
+            _record_cache.pop((model_class.__name__, record_id), None)
+    _after_commit(invalidate)
+    invalidate_table(model_class)
+
 def serialize_record(obj):
     """Convert SQLAlchemy object to dictionary with proper JSON serialization"""
     if obj is None:
         return None
     
-    result = {}
-    for column in obj.__table__.columns:
-        value = getattr(obj, column.name)
-        if isinstance(value, (datetime, date)):
-            value = value.isoformat()
-        elif isinstance(value, list):
-            # Handle array fields - ensure proper JSON serialization
-            value = value if value is not None else []
-        result[column.name] = value
-    return result
+    # Generated per model in db_model: literal attribute reads, no per-column dispatch
+    return obj._serialize()
 
 def parse_date_string(date_str: str) -> Optional[datetime]:
     """Parse date string to datetime object"""
     if not date_str:
         return None
     try:
-        # Try parsing as full datetime first (YYYY-MM-DD HH:MM:SS format)
-        if 'T' in date_str or ' ' in date_str:
-            # Handle ISO format with T separator or space separator
-            for fmt in ['%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%d %H:%M:%S.%f']:
-                try:
-                    return datetime.strptime(date_str, fmt)
-                except ValueError:
-                    continue
-        # Try parsing as date only (YYYY-MM-DD format) and convert to datetime
-        try:
-            date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-            return date_obj  # This will be datetime at midnight
-        except ValueError:
-            pass
-        return None
-    except Exception:
+        # One C-level ISO 8601 parse covers 'YYYY-MM-DD' (midnight) and
+        # 'YYYY-MM-DD[T ]HH:MM:SS[.ffffff]', the formats previously tried one by one
+        return datetime.fromisoformat(date_str)
+    except (TypeError, ValueError):
         return None
 
 def parse_array_field(value: Any) -> Optional[List]:
@@ -99,19 +250,25 @@ def parse_array_field(value: Any) -> Optional[List]:
     elif isinstance(value, str):
         try:
             # Try parsing as JSON array
-            parsed = json.loads(value)
+            parsed = orjson.loads(value)
             if isinstance(parsed, list):
                 return parsed
             else:
                 # Single value, wrap in list
                 return [parsed]
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             # Treat as comma-separated values
             return [item.strip() for item in value.split(',') if item.strip()]
     else:
         # Single value, wrap in list
         return [value]
 
+@lru_cache(maxsize=4096)
+def _closest_valid_value(table: str, field: str, value_lower: str) -> tuple:
+    """(valid value, score) closest to a lower-cased input that had no exact match"""
+    _, best_score, best_match = process.extractOne(value_lower, _LOWER_CHOICES[table][field], scorer=fuzz.ratio, processor=None)
+    return best_match, best_score
+
 def validate_field_value(table: str, field: str, value: str) -> dict:
     """Validate field value against valid options"""
     if table not in VALID_STATUS:
@@ -127,19 +284,12 @@ def validate_field_value(table: str, field: str, value: str) -> dict:
     value_lower = value.lower()
     
     # Check for exact match (case-insensitive)
-    for valid_value in valid_values:
-        if value_lower == valid_value.lower():
-            return {"is_valid": True, "suggested_value": valid_value}
-    
-    # Find closest match using fuzzy matching
-    best_match = None
-    best_score = 0
+    exact_match = _VALID_LOOKUP[table][field].get(value_lower)
+    if exact_match is not None:
+        return {"is_valid": True, "suggested_value": exact_match}
     
-    for valid_value in valid_values:
-        score = fuzz.ratio(value_lower, valid_value.lower())
-        if score > best_score:
-            best_score = score
-            best_match = valid_value
+    # Find closest match using fuzzy matching (memoized: the same typos recur)
+    best_match, best_score = _closest_valid_value(table, field, value_lower)
     
     # If similarity is high enough, suggest the match
     if best_score >= 60:
@@ -154,4 +304,21 @@ def validate_field_value(table: str, field: str, value: str) -> dict:
         "is_valid": False,
         "suggested_value": valid_values[0],  # Default to first valid option
         "similarity": best_score
-    }
\ No newline at end of file
+    }
+
+def validate_fields(table: str, data: dict) -> Optional[tuple]:
+    """First (field, value, result) in `data` whose value fails validate_field_value, else None.
+
+    Only fields with validation rules are stringified and checked; a table without rules
+    returns at once.
+    """
+    table_validations = VALID_STATUS.get(table)
+    if not table_validations:
+        return None
+    for field, value in data.items():
+        if field in table_validations:
+            value = str(value)
+            result = validate_field_value(table, field, value)
+            if not result['is_valid']:
+                return field, value, result
+    return None
@@ -11,9 +11,44 @@ from langgraph_supervisor import create_supervisor
 from langchain.chat_models import init_chat_model
 from langgraph.checkpoint.memory import MemorySaver  # Memory storage
 from app.agents.database_agent.agent import DatabaseAgent
+from config import db_pool_budget
+
+def _make_checkpointer():
+    """Supervisor checkpointer: Postgres when CHECKPOINT_DATABASE_URL is set, else in-process.
+
+    MemorySaver keeps threads per worker process, so with several workers (or a reload) a
+    conversation only continues on the worker that started it. The Postgres saver is shared
+    by all workers; it needs langgraph-checkpoint-postgres, psycopg and psycopg-pool.
+    """
+    url = os.getenv("CHECKPOINT_DATABASE_URL")
+    if not url:
+        return MemorySaver()
+
+    try:
+        from psycopg_pool import ConnectionPool
+        from langgraph.checkpoint.postgres import PostgresSaver
+    except ImportError as e:
+        raise ImportError(
+            "CHECKPOINT_DATABASE_URL is set but the Postgres checkpointer is not installed: "
+            "it needs langgraph-checkpoint-postgres, psycopg and psycopg-pool "
+            "(pip install -r requirements.txt, or unset it to keep conversations in memory)"
+        ) from e
+
+    # psycopg_pool's default min_size (4) can exceed a small budget, which it rejects
+    max_size = int(os.getenv("CHECKPOINT_POOL_SIZE", db_pool_budget("checkpoint")))
+    # autocommit and no server-side prepares, as PostgresSaver requires for pooled connections
+    pool = ConnectionPool(
+        conninfo=url,
+        min_size=min(1, max_size),
+        max_size=max_size,
+        kwargs={"autocommit": True, "prepare_threshold": 0},
+    )
+    checkpointer = PostgresSaver(pool)
+    checkpointer.setup()  # creates / migrates the checkpoint tables; idempotent
+    return checkpointer
 
 # Create memory checkpointer
-memory = MemorySaver()
+memory = _make_checkpointer()
 
 # Create database agent instance
 database_agent = DatabaseAgent()
@@ -31,18 +66,16 @@ class DatabaseAgentWrapper:
             if messages and hasattr(messages[-1], 'content'):
                 user_message = messages[-1].content
                 
-                # Build context from recent conversation
-                context_messages = []
-                for msg in messages[-5:]:  # Get last 5 messages for context
-                    if hasattr(msg, 'content'):
-                        if hasattr(msg, 'type') and msg.type == 'human':
-                            context_messages.append(f"User: {msg.content}")
-                        else:
-                            context_messages.append(f"Assistant: {msg.content}")
-                
-                # Create a comprehensive context message
-                context = "\n".join(context_messages)
-                full_message = f"CONVERSATION CONTEXT:\n{context}\n\nCURRENT REQUEST: {user_message}"
+                if len(messages) == 1:
+                    # Fresh conversation: the request is the whole context
+                    full_message = user_message
+                else:
+                    # Build context from the last 5 messages and create a comprehensive context message
+                    context = "\n".join(
+                        f"{'User' if getattr(msg, 'type', None) == 'human' else 'Assistant'}: {msg.content}"
+                        for msg in messages[-5:] if hasattr(msg, 'content')
+                    )
+                    full_message = f"CONVERSATION CONTEXT:\n{context}\n\nCURRENT REQUEST: {user_message}"
                 
                 print(f"🔧 Database Agent Processing: {full_message}")
                 response = self.db_agent.process_message(full_message)
@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import contextvars
+import logging
+
+logger = logging.getLogger(__name__)
+
+class _LoopState:
+    """Queue, worker task and in-flight limit bound to a single event loop"""
+    def __init__(self, max_inflight):
+        self.queue = asyncio.Queue()
+        self.inflight = asyncio.Semaphore(max_inflight)
+        self.worker = None
+        self.dispatches = set()  # strong references to in-flight dispatch tasks
+
+class AsyncBatcher:
+    """Collect concurrent submissions for a short window and hand them to one batch call.
+
+    `batch_fn` is an async callable taking a list of items and returning a list of
+    results in the same order; a result that is an Exception is raised to its caller.
+    """
+    def __init__(self, batch_fn, max_batch=32, max_wait=0.03, max_inflight=1):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_inflight = max_inflight
+        # Sync callers go through asyncio.run, so there may be several loops (one per thread).
+        # The worker task references its loop, so entries are removed explicitly when the
+        # worker ends (asyncio.run cancels it on shutdown) or when the loop is found closed
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def _get_state(self):
+        """Return the state for the running loop, starting its worker on first use"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            for other in [other for other in self._states if other.is_closed()]:
+                del self._states[other]
+            state = self._states.get(loop)
+            if state is None or state.worker is None or state.worker.done():
+                state = _LoopState(self.max_inflight)
+                # Start the worker in an empty context so it does not inherit the first
+                # submitter's context variables; each batch runs in its submitter's instead
+                state.worker = contextvars.Context().run(loop.create_task, self._run(state))
+                state.worker.add_done_callback(lambda _, loop=loop, state=state: self._forget(loop, state))
+                self._states[loop] = state
+        return state
+
+    def _forget(self, loop, state):
+        with self._lock:
+            if self._states.get(loop) is state:
+                del self._states[loop]
+
+    async def submit(self, item):
+        """Queue one item and wait for its result from the next dispatched batch"""
+        state = self._get_state()
+        future = asyncio.get_running_loop().create_future()
+        await state.queue.put((item, future, contextvars.copy_context()))
+        return await future
+
+    async def _run(self, state):
+        """Drain the queue into batches of up to max_batch items or max_wait seconds"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await state.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(state.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await state.inflight.acquire()
+            # The batch call runs in the first submitter's context (LangChain callbacks,
+            # tracing); one batch can only carry one
+            task = batch[0][2].run(loop.create_task, self._dispatch(state, batch))
+            state.dispatches.add(task)
+            task.add_done_callback(state.dispatches.discard)
+
+    async def _dispatch(self, state, batch):
+        """Run one batch call and resolve each submitter's future"""
+        try:
+            try:
+                results = await self.batch_fn([item for item, _, _ in batch])
+            except Exception as e:
+                logger.error("Batch of %d failed: %s", len(batch), e)
+                results = [e] * len(batch)
+
+            for (_, future, _), result in zip(batch, results):
+                if future.done():  # submitter was cancelled
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        finally:
+            state.inflight.release()
@@ -0,0 +1,132 @@
+import os
+import csv
+import time
+import queue
+import atexit
+from collections import deque
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CsvAppender:
+    """Append rows to a CSV file from one background thread, writing queued rows in batches.
+
+    The file is opened (and the header written if it is empty) by the first `append`, which
+    raises if that fails. Later appends return at once; a batch the writer thread could not
+    write makes the next `append` raise that error. Call `flush` before reading the file to
+    see every row appended so far.
+
+    The last `tail_size` rows are also kept in memory for `tail`. They are re-read from the
+    file only when its size shows someone else wrote to it (or on first use).
+    """
+    def __init__(self, path, header, max_batch=256, max_wait=0.05, tail_size=20):
+        self.path = path
+        self.header = header
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._worker = None
+        self._file = None
+        self._writer = None
+        self._error = None  # last write failure, raised by the next append
+        self._lock = threading.Lock()
+        self._tail = deque(maxlen=tail_size)
+        self._tail_size = None  # file size the cached tail reflects; None = not loaded
+        self._tail_lock = threading.Lock()
+
+    def append(self, row):
+        """Queue one row for the writer thread.
+
+        Raises OSError if the file cannot be opened, or the error that made the writer
+        drop an earlier batch (once; the row passed in is not queued then).
+        """
+        self._ensure_worker()
+        with self._lock:
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+        self._queue.put(row)
+
+    def flush(self):
+        """Block until every queued row has been written"""
+        if self._worker is not None:
+            self._queue.join()
+
+    def tail(self, n):
+        """Last `n` rows as dicts keyed by the file's header (oldest first)"""
+        self.flush()
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return []
+        with self._tail_lock:
+            if self._tail_size != size:
+                # Rows can span lines (quoted newlines), so parse forward rather than scan back;
+                # the deque keeps only the last rows in memory
+                with open(self.path, 'r', newline='', encoding='utf-8') as file:
+                    self._tail = deque(csv.DictReader(file), maxlen=self._tail.maxlen)
+                    self._tail_size = os.fstat(file.fileno()).st_size
+            rows = list(self._tail)
+        return rows[-n:] if n < len(rows) else rows
+
+    def _open(self):
+        """Open the file for appending, writing the header if it is empty"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        file = open(self.path, 'a', newline='', encoding='utf-8')
+        try:
+            writer = csv.writer(file)
+            if file.tell() == 0:
+                writer.writerow(self.header)
+                file.flush()
+        except BaseException:
+            file.close()
+            raise
+        self._file, self._writer = file, writer
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._file is None:
+                self._open()
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=f"csv-{os.path.basename(self.path)}", daemon=True)
+                self._worker.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        """Drain the queue into batches of up to max_batch rows or max_wait seconds"""
+        file, writer = self._file, self._writer
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            try:
+                size_before = os.fstat(file.fileno()).st_size
+                writer.writerows(batch)
+                file.flush()
+                with self._tail_lock:
+                    # Keep the cached tail in step unless another writer got there first
+                    if self._tail_size == size_before:
+                        self._tail.extend({key: '' if value is None else str(value) for key, value in zip(self.header, row)} for row in batch)
+                        self._tail_size = file.tell()
+                    else:
+                        self._tail_size = None
+            except Exception as e:
+                logger.error("Error writing %d rows to %s: %s", len(batch), self.path, e)
+                with self._tail_lock:
+                    self._tail_size = None  # part of the batch may have reached the file
+                with self._lock:
+                    self._error = e
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
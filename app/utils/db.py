@@ -1,45 +1,72 @@
+import os
+import threading
+from contextlib import contextmanager
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from config import DATABASE_URL
+from psycopg2.pool import ThreadedConnectionPool
+from config import DATABASE_URL, db_pool_budget
 import logging
 
 # Disable logging for clean output
 logging.disable(logging.CRITICAL)
 logger = logging.getLogger(__name__)
 
+# Connections kept open per process; each query borrows one, so concurrent callers never
+# share a cursor and the TCP/TLS handshake happens only when the pool grows. The maximum
+# defaults to this pool's slice of the process's connection budget (config.db_pool_budget)
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", db_pool_budget("utils")))
+DB_POOL_MIN = min(int(os.getenv("DB_POOL_MIN", 2)), DB_POOL_MAX)
+
 class DatabaseManager:
     def __init__(self):
-        self.connection = None
-        self.cursor = None
+        self.pool = None
+        self._lock = threading.Lock()
     
     def connect(self):
-        """Establish database connection"""
-        try:
-            self.connection = psycopg2.connect(DATABASE_URL)
-            self.cursor = self.connection.cursor(cursor_factory=RealDictCursor)
-            logger.info("Database connection established")
-            return True
-        except Exception as e:
-            logger.error(f"Database connection failed: {e}")
-            return False
+        """Open the connection pool (first call only)"""
+        with self._lock:
+            if self.pool is not None:
+                return True
+            try:
+                self.pool = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, dsn=DATABASE_URL)
+                logger.info("Database connection pool established")
+                return True
+            except Exception as e:
+                logger.error(f"Database connection failed: {e}")
+                return False
     
     def disconnect(self):
-        """Close database connection"""
-        if self.cursor:
-            self.cursor.close()
-        if self.connection:
-            self.connection.close()
+        """Close every pooled connection"""
+        with self._lock:
+            if self.pool is not None:
+                self.pool.closeall()
+                self.pool = None
         logger.info("Database connection closed")
     
+    @contextmanager
+    def _cursor(self):
+        """Borrow a pooled connection and a RealDictCursor on it; the connection goes back
+        to the pool afterwards (rolled back if a transaction is still open)"""
+        if self.pool is None and not self.connect():
+            raise psycopg2.OperationalError("Database connection pool unavailable")
+        pool = self.pool
+        conn = pool.getconn()
+        broken = False
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                yield conn, cursor
+        except psycopg2.OperationalError:
+            broken = True
+            raise
+        finally:
+            pool.putconn(conn, close=broken or conn.closed)
+    
     def execute_query(self, query, params=None):
         """Execute a SELECT query and return results"""
         try:
-            if not self.connection or self.connection.closed:
-                self.connect()
-            
-            self.cursor.execute(query, params)
-            results = self.cursor.fetchall()
-            return results
+            with self._cursor() as (conn, cursor):
+                cursor.execute(query, params)
+                return cursor.fetchall()
         except Exception as e:
             logger.error(f"Query execution failed: {e}")
             return None
@@ -47,15 +74,16 @@ class DatabaseManager:
     def execute_update(self, query, params=None):
         """Execute an INSERT/UPDATE/DELETE query"""
         try:
-            if not self.connection or self.connection.closed:
-                self.connect()
-            
-            self.cursor.execute(query, params)
-            self.connection.commit()
+            with self._cursor() as (conn, cursor):
+                try:
+                    cursor.execute(query, params)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
             return True
         except Exception as e:
             logger.error(f"Update execution failed: {e}")
-            self.connection.rollback()
             return False
     
     def get_table_schema(self, table_name):
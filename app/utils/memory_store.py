@@ -1,26 +1,122 @@
-from langchain_community.vectorstores import FAISS
 from langchain_openai import OpenAIEmbeddings
 from langchain_core.tools import tool
 import os
+import asyncio
+import functools
+import threading
 from config import OPENAI_API_KEY
+from app.utils.batching import AsyncBatcher
 
 os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
 embeddings = OpenAIEmbeddings()
 
-# Init empty store (add_texts for chunks)
-memory_store = FAISS.from_texts(["Initial empty memory."], embeddings)  # Swap Supabase
+# With MEMORY_DATABASE_URL (a postgresql+psycopg:// URL) memories live in pgvector and are
+# shared by every worker; otherwise each process keeps its own FAISS index (run a single
+# worker then: each one saves its index over the others')
+MEMORY_DATABASE_URL = os.getenv("MEMORY_DATABASE_URL")
+
+# Without pgvector the FAISS index is saved here after every write and loaded on first use,
+# so a restart does not re-embed a bootstrap document (an OpenAI call) or lose memories
+MEMORY_INDEX_DIR = os.getenv("MEMORY_INDEX_DIR", "./memory_index")
+
+# Serializes FAISS writes and saves: save_local pickles the docstore while add mutates it
+_faiss_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=1)
+def _memory_store():
+    """Open the memory vector store (once per process, on first use)"""
+    if MEMORY_DATABASE_URL:
+        try:
+            from langchain_postgres import PGVector
+        except ImportError as e:
+            raise ImportError(
+                "MEMORY_DATABASE_URL is set but langchain-postgres is not installed "
+                "(pip install -r requirements.txt, or unset it to use the local FAISS index)"
+            ) from e
+
+        return PGVector(
+            embeddings=embeddings,
+            collection_name="minh_memory",
+            connection=MEMORY_DATABASE_URL,
+            use_jsonb=True,
+        )
+
+    from langchain_community.vectorstores import FAISS
+
+    if os.path.exists(os.path.join(MEMORY_INDEX_DIR, "index.faiss")):
+        # Our own pickle, written by _save below
+        return FAISS.load_local(MEMORY_INDEX_DIR, embeddings, allow_dangerous_deserialization=True)
+
+    # FAISS cannot be built without a vector, so seed it once and persist it
+    store = FAISS.from_texts(["Initial empty memory."], embeddings)
+    store.save_local(MEMORY_INDEX_DIR)
+    return store
+
+def _add_embedded(texts, vectors):
+    """Add already-embedded texts to FAISS and save the index"""
+    store = _memory_store()
+    with _faiss_lock:
+        store.add_embeddings(list(zip(texts, vectors)))
+        store.save_local(MEMORY_INDEX_DIR)
 
 @tool
 def store_chunk(content: str, category: str) -> str:
     """Store parsed chunk (insight/task/health) in long-term memory."""
-    global memory_store
-    memory_store.add_texts([f"{category}: {content}"])
+    text = f"{category}: {content}"
+    if MEMORY_DATABASE_URL:
+        _memory_store().add_texts([text])
+    else:
+        _add_embedded([text], embeddings.embed_documents([text]))
     return f"Stored {category}: {content}."
 
 @tool
 def retrieve_similar(query: str, k: int = 3) -> str:
     """Retrieve similar past thoughts (pgvector mock)."""
-    docs = memory_store.similarity_search(query, k=k)
+    docs = _memory_store().similarity_search(query, k=k)
+    if not docs:
+        return "No similar thoughts found."
+    return "\n".join([doc.page_content for doc in docs])
+
+# Async callers (the agent's ToolNode) share embedding requests: chunks and queries arriving
+# within EMBED_BATCH_WINDOW go to OpenAI as one embeddings call instead of one call each
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 64))
+EMBED_BATCH_WINDOW = float(os.getenv("EMBED_BATCH_WINDOW", 0.05))  # seconds
+
+# The PGVector store is opened in sync mode (its a* methods need async_mode and an async
+# engine), so the async paths below run its sync methods on a worker thread
+
+async def _store_batch(texts):
+    """Embed and store a batch of chunks with one embeddings call"""
+    if MEMORY_DATABASE_URL:
+        store = await asyncio.to_thread(_memory_store)
+        await asyncio.to_thread(store.add_texts, texts)
+    else:
+        vectors = await embeddings.aembed_documents(texts)
+        await asyncio.to_thread(_add_embedded, texts, vectors)
+    return [None] * len(texts)
+
+async def _search_batch(queries):
+    """Embed a batch of (query, k) searches at once, then search each vector"""
+    vectors = await embeddings.aembed_documents([query for query, _ in queries])
+    return await asyncio.to_thread(_search_vectors, vectors, [k for _, k in queries])
+
+def _search_vectors(vectors, ks):
+    """Nearest documents for each vector, `k` each (blocking: FAISS or pgvector)"""
+    memory_store = _memory_store()
+    return [memory_store.similarity_search_by_vector(vector, k=k) for vector, k in zip(vectors, ks)]
+
+_store_batcher = AsyncBatcher(_store_batch, max_batch=EMBED_BATCH_SIZE, max_wait=EMBED_BATCH_WINDOW)
+_search_batcher = AsyncBatcher(_search_batch, max_batch=EMBED_BATCH_SIZE, max_wait=EMBED_BATCH_WINDOW)
+
+async def _astore_chunk(content: str, category: str) -> str:
+    await _store_batcher.submit(f"{category}: {content}")
+    return f"Stored {category}: {content}."
+
+async def _aretrieve_similar(query: str, k: int = 3) -> str:
+    docs = await _search_batcher.submit((query, k))
     if not docs:
         return "No similar thoughts found."
-    return "\n".join([doc.page_content for doc in docs])
\ No newline at end of file
+    return "\n".join([doc.page_content for doc in docs])
+
+store_chunk.coroutine = _astore_chunk
+retrieve_similar.coroutine = _aretrieve_similar
@@ -1,13 +1,25 @@
 from langchain_openai import OpenAIEmbeddings
 from langchain_chroma import Chroma
 import os
+import functools
 from config import OPENAI_API_KEY
 os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
 
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+# text-embedding-3 vectors can be shortened (Matryoshka): 512 dims of the small model keep
+# most of the retrieval quality of 3072-dim large vectors at a sixth of the storage and
+# distance cost
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", 512))
 
-vector_store = Chroma(
-    collection_name="dao_context_collection",
-    embedding_function=embeddings,
-    persist_directory="./chroma_langchain_db",
-)
\ No newline at end of file
+embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSIONS)
+
+# Vectors of different models / sizes cannot share a collection, so the name carries both;
+# documents embedded with another setting must be re-added to the new collection
+@functools.lru_cache(maxsize=1)
+def get_vector_store():
+    """Open the persistent Chroma collection (once per process, on first use)"""
+    return Chroma(
+        collection_name=f"dao_context_collection_{EMBEDDING_MODEL.rsplit('-', 1)[-1]}_{EMBEDDING_DIMENSIONS}",
+        embedding_function=embeddings,
+        persist_directory="./chroma_langchain_db",
+    )
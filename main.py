@@ -1,6 +1,7 @@
 # main.py
 import os
 import sys
+import logging
 from pathlib import Path
 from langchain_core.messages import HumanMessage, AIMessage
 import uuid
@@ -54,4 +55,8 @@ def main():
             traceback.print_exc()
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    )
     main()
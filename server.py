@@ -1,12 +1,26 @@
 # server.py
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import uvicorn
+import orjson
 import uuid
+import logging
+
+# Configured here rather than under __main__: with reload=True uvicorn re-imports this
+# module in a worker process, and the agent import below already logs
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+)
+
 from app.agents.database_agent.agent import DatabaseAgent
-app = FastAPI(title="Minh's Personal AI Copilot")
+
+app = FastAPI(title="Minh's Personal AI Copilot", default_response_class=ORJSONResponse)
+# Gzip JSON and the chat page (Starlette skips text/event-stream, so /api/chat/stream is untouched)
+app.add_middleware(GZipMiddleware, minimum_size=512, compresslevel=5)
 
 # Initialize a single copilot (database agent) instance
 agent = DatabaseAgent()
@@ -33,13 +47,13 @@ async def chat_endpoint(request: Request):
     try:
         data = await request.json()
         message = data.get("message", "")
-        thread_id = data.get("thread_id") or str(uuid.uuid4())
+        thread_id = data.get("thread_id") or uuid.uuid4().hex
 
         if not message:
             return {"error": "No message provided"}
 
         # Directly process via the copilot (database agent)
-        response_text = agent.process_message(message)
+        response_text = await agent.aprocess_message(message)
 
         return {"response": response_text, "thread_id": thread_id, "status": "success"}
 
@@ -53,37 +67,23 @@ async def chat_endpoint(request: Request):
 async def chat_stream_endpoint(request: Request):
     """Handle streaming chat messages"""
     from fastapi.responses import StreamingResponse
-    import asyncio
-    import json
     
     try:
         data = await request.json()
         message = data.get("message", "")
-        thread_id = data.get("thread_id") or str(uuid.uuid4())
+        thread_id = data.get("thread_id") or uuid.uuid4().hex
 
         if not message:
             return {"error": "No message provided"}
 
         async def generate_stream():
             # Send thread_id first
-            yield f"data: {json.dumps({'thread_id': thread_id})}\n\n"
-            
-            # Process message and stream response
-            response_text = agent.process_message(message)
-            
-            # Simulate streaming by sending chunks
-            words = response_text.split()
-            current_text = ""
-            
-            for i, word in enumerate(words):
-                current_text += word + " "
-                
-                # Send chunk every few words
-                if i % 3 == 0 or i == len(words) - 1:
-                    # Emit as SSE chunk
-                    yield f"data: {json.dumps({'content': current_text})}\n\n"
-                    await asyncio.sleep(0.05)  # Small delay for streaming effect
+            yield f"data: {orjson.dumps({'thread_id': thread_id}).decode()}\n\n"
             
+            # Forward the reply as the model emits it; the page appends each delta
+            async for delta in agent.astream_message(message):
+                yield f"data: {orjson.dumps({'content': delta}).decode()}\n\n"
+
             # Send completion signal
             yield "data: [DONE]\n\n"
 
@@ -0,0 +1,45 @@
+import unittest
+
+try:
+    from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+    from app.agents.database_agent.agent import DatabaseAgent, MAX_HISTORY
+except ImportError:  # app dependencies not installed
+    DatabaseAgent = None
+
+
+@unittest.skipIf(DatabaseAgent is None, "app dependencies not installed")
+class EphemeralEvictionTest(unittest.TestCase):
+    def _fill(self, agent, count, start=0):
+        for i in range(start, start + count):
+            agent._append(HumanMessage(content=f"m{i}"))
+
+    def test_notes_are_evicted_before_older_turns(self):
+        agent = DatabaseAgent()
+        self._fill(agent, 2)
+        agent._note("created: tasks #1")
+        self._fill(agent, MAX_HISTORY - 3, start=2)
+        self.assertEqual(len(agent._tail), MAX_HISTORY)
+
+        agent._append(HumanMessage(content="new"))
+        contents = [message.content for message in agent._tail]
+        self.assertNotIn("[created: tasks #1]", contents)
+        self.assertEqual(contents[:2], ["m0", "m1"])
+        self.assertEqual(contents[-1], "new")
+
+    def test_oldest_message_goes_when_there_are_no_notes(self):
+        agent = DatabaseAgent()
+        self._fill(agent, MAX_HISTORY + 1)
+        self.assertEqual(agent._tail[0].content, "m1")
+
+    def test_tool_call_stays_pinned(self):
+        agent = DatabaseAgent()
+        agent._append(AIMessage(content="", tool_calls=[{"name": "read_record", "args": {}, "id": "c1"}]))
+        agent._append(ToolMessage(content="{}", tool_call_id="c1"))
+        self._fill(agent, MAX_HISTORY - 1)
+        history = agent.conversation_history
+        self.assertTrue(history[1].tool_calls)
+        self.assertIsInstance(history[2], ToolMessage)
+
+
+if __name__ == "__main__":
+    unittest.main()
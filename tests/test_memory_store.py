@@ -0,0 +1,60 @@
+import os
+import asyncio
+import unittest
+from unittest import mock
+
+try:
+    os.environ.setdefault("OPENAI_API_KEY", "test-key")
+    from app.utils import memory_store
+except ImportError:  # app dependencies not installed
+    memory_store = None
+
+
+class _SyncOnlyPGVector:
+    """Stands in for a sync-mode langchain_postgres.PGVector: its async methods refuse to run"""
+    def __init__(self):
+        self.added = []
+
+    def add_texts(self, texts):
+        self.added.extend(texts)
+        return [str(i) for i, _ in enumerate(texts)]
+
+    def similarity_search_by_vector(self, vector, k=4):
+        return [f"doc {vector[0]}-{i}" for i in range(k)]
+
+    async def aadd_texts(self, texts):
+        raise AssertionError("This method must be called with async_mode")
+
+    async def asimilarity_search_by_vector(self, vector, k=4):
+        raise AssertionError("This method must be called with async_mode")
+
+
+@unittest.skipIf(memory_store is None, "app dependencies not installed")
+class PGVectorBranchTest(unittest.TestCase):
+    def setUp(self):
+        self.store = _SyncOnlyPGVector()
+        patches = [
+            mock.patch.object(memory_store, "MEMORY_DATABASE_URL", "postgresql+psycopg://test/db"),
+            mock.patch.object(memory_store, "_memory_store", lambda: self.store),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_store_batch_uses_sync_add_texts(self):
+        result = asyncio.run(memory_store._store_batch(["insight: a", "task: b"]))
+        self.assertEqual(result, [None, None])
+        self.assertEqual(self.store.added, ["insight: a", "task: b"])
+
+    def test_search_batch_uses_sync_search(self):
+        class FakeEmbeddings:
+            async def aembed_documents(self, texts):
+                return [[float(i)] for i, _ in enumerate(texts)]
+
+        with mock.patch.object(memory_store, "embeddings", FakeEmbeddings()):
+            results = asyncio.run(memory_store._search_batch([("one", 1), ("two", 2)]))
+        self.assertEqual(results, [["doc 0.0-0"], ["doc 1.0-0", "doc 1.0-1"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
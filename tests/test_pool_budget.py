@@ -0,0 +1,44 @@
+import os
+import importlib
+import unittest
+from unittest import mock
+
+try:
+    import config
+except ImportError:  # python-dotenv not installed
+    config = None
+
+
+@unittest.skipIf(config is None, "app dependencies not installed")
+class PoolBudgetTest(unittest.TestCase):
+    def _config(self, **env):
+        with mock.patch.dict(os.environ, {key: str(value) for key, value in env.items()}):
+            self.addCleanup(importlib.reload, config)
+            return importlib.reload(config)
+
+    def test_shares_add_up_to_one(self):
+        self.assertAlmostEqual(sum(config.DB_POOL_SHARES.values()), 1.0)
+
+    def test_pools_stay_within_process_budget(self):
+        for max_conn, reserved, workers in [(100, 10, 1), (100, 10, 6), (20, 10, 1), (500, 20, 4)]:
+            with self.subTest(max_conn=max_conn, reserved=reserved, workers=workers):
+                cfg = self._config(DB_MAX_CONN=max_conn, DB_RESERVED_CONN=reserved, WEB_CONCURRENCY=workers)
+                self.assertEqual(cfg.DB_PROCESS_BUDGET, max(4, (max_conn - reserved) // workers))
+                budgets = {pool: cfg.db_pool_budget(pool) for pool in cfg.DB_POOL_SHARES}
+                self.assertTrue(all(budget >= 1 for budget in budgets.values()))
+                if cfg.DB_PROCESS_BUDGET >= 10:
+                    self.assertLessEqual(sum(budgets.values()), cfg.DB_PROCESS_BUDGET)
+
+    def test_small_budget_keeps_every_pool_usable(self):
+        # 90 connections across 6 workers: 15 each, so the checkpoint pool gets 3
+        cfg = self._config(DB_MAX_CONN=100, DB_RESERVED_CONN=10, WEB_CONCURRENCY=6)
+        self.assertEqual(cfg.db_pool_budget("checkpoint"), 3)
+        self.assertEqual(cfg.db_pool_budget("utils"), 2)
+
+    def test_budget_floor(self):
+        cfg = self._config(DB_MAX_CONN=20, DB_RESERVED_CONN=10, WEB_CONCURRENCY=8)
+        self.assertEqual(cfg.DB_PROCESS_BUDGET, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,36 +1,64 @@
 # whatsapp_server.py
 import os
-import json
+import hmac
+import orjson
+import logging
 import asyncio
 import aiohttp
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from fastapi import FastAPI, Request, HTTPException, Query
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, ORJSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import uvicorn
 from dotenv import load_dotenv
 
-# Import the database agent directly
-from app.agents.database_agent.agent import DatabaseAgent
-
 # Load environment variables
 load_dotenv()
 
+# Configured on import rather than under __main__, so uvicorn's worker processes (which import
+# this module by name) log too. Only warnings and errors by default; LOG_LEVEL=INFO adds the
+# startup banner and webhook events, LOG_LEVEL=DEBUG the per-message traces
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "WARNING").upper(),
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+)
+logger = logging.getLogger(__name__)
+
+# Import the database agent directly
+from app.agents.database_agent.agent import DatabaseAgent
+from app.agents.database_agent.conversation_store import get_conversation_store
+from app.agents.database_agent.db_model import pool_status
+
 # Initialize FastAPI app
-app = FastAPI(title="DaoOS WhatsApp API", version="1.0.0")
+app = FastAPI(title="DaoOS WhatsApp API", version="1.0.0", default_response_class=ORJSONResponse)
+# Compress JSON and HTML bodies; Starlette leaves text/event-stream uncompressed so SSE
+# events are not held back in the compressor's buffer
+app.add_middleware(GZipMiddleware, minimum_size=512, compresslevel=5)
 
 # WhatsApp Cloud API configuration
 VERIFY_TOKEN = os.getenv("VERIFY_TOKEN", "your_verify_token_here")
 ACCESS_TOKEN = os.getenv("ACCESS_TOKEN", "your_access_token_here")
 PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID", "your_phone_number_id_here")
 WHATSAPP_API_URL = f"https://graph.facebook.com/v23.0/{PHONE_NUMBER_ID}/messages"
+WHATSAPP_HEADERS = {
+    'Authorization': f'Bearer {ACCESS_TOKEN}',
+    'Content-Type': 'application/json'
+}
+# Fixed parts of the Graph API payloads; each call merges in its own fields
+_TEXT_MESSAGE = {"messaging_product": "whatsapp", "type": "text"}
+_TYPING_STATUS = {"messaging_product": "whatsapp", "status": "read", "typing_indicator": {"type": "text"}}
 
 # Templates for web UI
 templates = Jinja2Templates(directory="templates")
 
+# Webhook processing tasks still running. The event loop only keeps weak references to
+# tasks, so one nothing else refers to can be garbage-collected before it finishes
+_tasks = set()
+
 # Pydantic models
 class WhatsAppMessage(BaseModel):
     to: str
@@ -40,118 +68,129 @@ class ChatMessage(BaseModel):
     message: str
     thread_id: Optional[str] = None
 
+# Webhook payload, down to the fields receive_webhook reads; everything else is ignored.
+# Defaults stand in for the .get(..., default) fallbacks of a hand-walked dict
+class WebhookText(BaseModel):
+    body: str = ""
+
+class WebhookMessage(BaseModel):
+    from_: Optional[str] = Field(None, alias="from")
+    id: Optional[str] = None
+    text: WebhookText = WebhookText()
+
+class WebhookValue(BaseModel):
+    messages: List[WebhookMessage] = []
+
+class WebhookChange(BaseModel):
+    field: Optional[str] = None
+    value: WebhookValue = WebhookValue()
+
+class WebhookEntry(BaseModel):
+    changes: List[WebhookChange] = []
+
 class WebhookData(BaseModel):
-    object: str
-    entry: list
+    object: Optional[str] = None
+    entry: List[WebhookEntry] = []
 
-# Global storage for conversation threads (in production, use Redis or database)
-conversation_threads: Dict[str, Dict] = {}
+# Agent state and thread ids are kept per session in the conversation store (Redis when
+# REDIS_URL is set, so every worker sees the same conversations)
+conversation_store = get_conversation_store()
 
-# Initialize the database agent
-database_agent = DatabaseAgent()
+# Initialize the database agent for the web chat
+database_agent = DatabaseAgent(session_id="web_user", store=conversation_store)
 
-async def send_whatsapp_message(to: str, message: str, message_id: Optional[str] = None) -> Dict[str, Any]:
-    """Send a message via WhatsApp Cloud API"""
-    headers = {
-        'Authorization': f'Bearer {ACCESS_TOKEN}',
-        'Content-Type': 'application/json'
-    }
-    
-    payload = {
-        "messaging_product": "whatsapp",
-        "to": to,
-        "type": "text",
-        "text": {
-            "body": message
-        }
-    }
+@app.on_event("startup")
+async def open_http_session() -> None:
+    """One keep-alive HTTP session for all Graph API calls (no TCP + TLS handshake per message)"""
+    app.state.http = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=100, limit_per_host=32, keepalive_timeout=60, ttl_dns_cache=300),
+        timeout=aiohttp.ClientTimeout(total=15),
+    )
+    # In the background so startup does not wait on Meta; the reference keeps the task alive
+    app.state.http_warmup = asyncio.create_task(warm_up_graph_api())
+
+async def warm_up_graph_api() -> None:
+    """Open a TLS connection to the Graph API so the first reply finds it in the keep-alive pool"""
+    try:
+        async with app.state.http.head(WHATSAPP_API_URL, timeout=aiohttp.ClientTimeout(total=5)):
+            pass
+    except Exception as e:
+        logger.debug("Graph API warm-up failed: %s", e)
+
+@app.on_event("shutdown")
+async def close_http_session() -> None:
+    await app.state.http.close()
+
+async def send_whatsapp_message(to: str, message: str, message_id: Optional[str] = None, parse_response: bool = False) -> Dict[str, Any]:
+    """Send a message via WhatsApp Cloud API.
+
+    Meta's reply is only decoded (and returned) with parse_response=True or on an error;
+    otherwise a successful send returns an empty dict.
+    """
+    payload = _TEXT_MESSAGE | {"to": to, "text": {"body": message}}
     
     # Add read receipt if message_id is provided
     if message_id:
         payload["context"] = {"message_id": message_id}
     
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.post(WHATSAPP_API_URL, headers=headers, json=payload) as response:
-                result = await response.json()
-                if response.status == 200:
-                    print(f"Message sent successfully to {to}")
-                    return result
-                else:
-                    print(f"Error sending message: {result}")
-                    return {"error": result}
-        except Exception as e:
-            print(f"Exception sending message: {e}")
-            return {"error": str(e)}
+    try:
+        async with app.state.http.post(WHATSAPP_API_URL, headers=WHATSAPP_HEADERS, data=orjson.dumps(payload)) as response:
+            # Always drain the body: an unread response closes the connection instead of
+            # returning it to the keep-alive pool
+            body = await response.read()
+            if response.status == 200:
+                logger.debug("Message sent successfully to %s", to)
+                return orjson.loads(body) if parse_response else {}
+            else:
+                result = orjson.loads(body)
+                logger.error("Error sending message: %s", result)
+                return {"error": result}
+    except Exception as e:
+        logger.error("Exception sending message: %s", e)
+        return {"error": str(e)}
 
 async def send_typing_indicator(to: str, message_id: str) -> None:
     """Send typing indicator to WhatsApp"""
-    headers = {
-        'Authorization': f'Bearer {ACCESS_TOKEN}',
-        'Content-Type': 'application/json'
-    }
-    
-    payload = {
-        "messaging_product": "whatsapp",
-        "status": "read",
-        "message_id": message_id,
-        "typing_indicator": {
-            "type": "text"
-        }
-    }
+    payload = _TYPING_STATUS | {"message_id": message_id}
     
     # Use the same messages endpoint for typing indicator
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.post(WHATSAPP_API_URL, headers=headers, json=payload) as response:
-                if response.status == 200:
-                    print(f"Typing indicator sent to {to}")
-                else:
-                    result = await response.json()
-                    print(f"Error sending typing indicator: {result}")
-        except Exception as e:
-            print(f"Error sending typing indicator: {e}")
-
-def get_or_create_thread(phone_number: str) -> str:
-    """Get or create a conversation thread for a phone number"""
-    if phone_number not in conversation_threads:
-        import uuid
-        thread_id = str(uuid.uuid4())
-        conversation_threads[phone_number] = {
-            "thread_id": thread_id,
-            "state": {"messages": []}
-        }
-    return conversation_threads[phone_number]["thread_id"]
+    try:
+        async with app.state.http.post(WHATSAPP_API_URL, headers=WHATSAPP_HEADERS, data=orjson.dumps(payload)) as response:
+            body = await response.read()  # drained for keep-alive, see send_whatsapp_message
+            if response.status == 200:
+                logger.debug("Typing indicator sent to %s", to)
+            else:
+                result = orjson.loads(body)
+                logger.warning("Error sending typing indicator: %s", result)
+    except Exception as e:
+        logger.warning("Error sending typing indicator: %s", e)
 
 async def process_whatsapp_message(from_number: str, message_text: str, message_id: str) -> None:
     """Process incoming WhatsApp message through the database agent"""
+    logger.debug("Processing message %s from %s: %s", message_id, from_number, message_text)
+    
+    # Send typing indicator with message ID (this marks as read AND shows typing) while the
+    # agent works, instead of waiting for its round trip first
+    typing = asyncio.create_task(send_typing_indicator(from_number, message_id))
+    
     try:
-        print(f"Processing message from {from_number}: {message_text}")
-        print(f"Message ID: {message_id}")
-        
-        # Get or create thread for this conversation
-        thread_id = get_or_create_thread(from_number)
-        thread_data = conversation_threads[from_number]
-        
-        # Send typing indicator with message ID (this marks as read AND shows typing)
-        await send_typing_indicator(from_number, message_id)
-        
-        # Add user message to state
-        thread_data["state"]["messages"].append({"content": message_text, "type": "human"})
-        
         # Process through database agent (typing indicator will show during this time)
-        ai_response = database_agent.process_message(message_text)
-        
-        # Add AI response to state
-        thread_data["state"]["messages"].append({"content": ai_response, "type": "ai"})
-        
-        # Send actual response back to WhatsApp
-        await send_whatsapp_message(from_number, ai_response, message_id)
-        
+        agent = DatabaseAgent(session_id=f"whatsapp:{from_number}", store=conversation_store)
+        ai_response = await agent.aprocess_message(message_text)
     except Exception as e:
-        print(f"Error processing message: {e}")
-        error_message = "I encountered an error processing your message. Please try again."
-        await send_whatsapp_message(from_number, error_message, message_id)
+        logger.error("Error processing message: %s", e)
+        ai_response = "I encountered an error processing your message. Please try again."
+    
+    # Normally long done; waiting keeps the indicator from landing after the reply
+    await typing
+    
+    # Send actual response back to WhatsApp
+    await send_whatsapp_message(from_number, ai_response, message_id)
+
+async def process_whatsapp_messages(from_number: str, messages: list) -> None:
+    """Process one sender's (text, message id) pairs from a webhook, one after another"""
+    for message_text, message_id in messages:
+        await process_whatsapp_message(from_number, message_text, message_id)
 
 # Routes
 @app.get("/", response_class=HTMLResponse)
@@ -164,80 +203,55 @@ async def chat_endpoint(chat_data: ChatMessage):
     """API endpoint for web chat"""
     try:
         # Use provided thread_id or create new one
-        thread_id = chat_data.thread_id or get_or_create_thread("web_user")
-        thread_data = conversation_threads.get("web_user", {"state": {"messages": []}})
-        
-        # Add user message
-        thread_data["state"]["messages"].append({"content": chat_data.message, "type": "human"})
-        
-        # Process through database agent
-        ai_response = database_agent.process_message(chat_data.message)
+        thread_id = chat_data.thread_id or await conversation_store.athread_id("web_user")
         
-        # Add AI response to state
-        thread_data["state"]["messages"].append({"content": ai_response, "type": "ai"})
+        # Process through database agent (it saves the conversation in the store)
+        ai_response = await database_agent.aprocess_message(chat_data.message)
         
-        # Update state
-        conversation_threads["web_user"] = thread_data
-        
-        return JSONResponse({
+        return {
             "response": ai_response,
             "thread_id": thread_id,
             "timestamp": datetime.now().isoformat()
-        })
+        }
         
     except Exception as e:
-        print(f"Error in chat endpoint: {e}")
+        logger.error("Error in chat endpoint: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/chat/stream")
 async def chat_stream_endpoint(chat_data: ChatMessage):
     """API endpoint for streaming chat responses"""
     from fastapi.responses import StreamingResponse
-    import json
     
     async def generate_stream():
         try:
             # Use provided thread_id or create new one
-            thread_id = chat_data.thread_id or get_or_create_thread("web_user")
-            thread_data = conversation_threads.get("web_user", {"state": {"messages": []}})
-            
-            # Add user message
-            thread_data["state"]["messages"].append({"content": chat_data.message, "type": "human"})
-            
-            # Process through database agent
-            ai_response = database_agent.process_message(chat_data.message)
+            thread_id = chat_data.thread_id or await conversation_store.athread_id("web_user")
+            yield f"data: {orjson.dumps({'thread_id': thread_id}).decode()}\n\n"
             
-            # Add AI response to state
-            thread_data["state"]["messages"].append({"content": ai_response, "type": "ai"})
-            
-            # Update state
-            conversation_threads["web_user"] = thread_data
-            
-            # Stream the response
-            yield f"data: {json.dumps({'thread_id': thread_id})}\n\n"
-            
-            # Split response into chunks for streaming effect
-            words = ai_response.split()
-            for i, word in enumerate(words):
-                chunk = word + " "
-                yield f"data: {json.dumps({'content': chunk})}\n\n"
-                await asyncio.sleep(0.05)  # Small delay for streaming effect
+            # Forward the reply as the model emits it (the agent saves the conversation in the store)
+            async for delta in database_agent.astream_message(chat_data.message):
+                yield f"data: {orjson.dumps({'content': delta}).decode()}\n\n"
             
             yield "data: [DONE]\n\n"
             
         except Exception as e:
-            print(f"Error in streaming chat endpoint: {e}")
-            yield f"data: {json.dumps({'content': 'Sorry, I encountered an error. Please try again.'})}\n\n"
+            logger.error("Error in streaming chat endpoint: %s", e)
+            yield f"data: {orjson.dumps({'content': 'Sorry, I encountered an error. Please try again.'}).decode()}\n\n"
             yield "data: [DONE]\n\n"
     
-    return StreamingResponse(generate_stream(), media_type="text/plain")
+    return StreamingResponse(
+        generate_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.post("/api/whatsapp/send")
 async def send_whatsapp_endpoint(message_data: WhatsAppMessage):
     """Send a message via WhatsApp"""
     try:
-        result = await send_whatsapp_message(message_data.to, message_data.message)
-        return JSONResponse(result)
+        result = await send_whatsapp_message(message_data.to, message_data.message, parse_response=True)
+        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -248,64 +262,85 @@ async def verify_webhook(
     hub_verify_token: str = Query(..., alias="hub.verify_token")
 ):
     """WhatsApp webhook verification"""
-    if hub_mode == "subscribe" and hub_verify_token == VERIFY_TOKEN:
-        print("Webhook verified successfully")
-        return int(hub_challenge)
+    # Constant-time compare (on bytes: compare_digest rejects non-ASCII str)
+    if hub_mode == "subscribe" and hmac.compare_digest(hub_verify_token.encode(), VERIFY_TOKEN.encode()):
+        logger.info("Webhook verified successfully")
+        return PlainTextResponse(hub_challenge)
     else:
-        print("Webhook verification failed")
+        logger.warning("Webhook verification failed")
         raise HTTPException(status_code=403, detail="Forbidden")
 
 @app.post("/webhook")
 async def receive_webhook(request: Request):
     """Receive WhatsApp webhook events"""
     try:
-        body = await request.json()
-        print(f"Webhook received: {json.dumps(body, indent=2)}")
+        raw = await request.body()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Webhook received: %s", raw.decode(errors="replace"))
         
-        if body.get("object") == "whatsapp_business_account":
-            for entry in body.get("entry", []):
-                for change in entry.get("changes", []):
-                    if change.get("field") == "messages":
-                        messages = change.get("value", {}).get("messages", [])
-                        for message in messages:
-                            from_number = message.get("from")
-                            message_text = message.get("text", {}).get("body", "")
-                            message_id = message.get("id")
-                            
-                            print(f"Processing message from {from_number}: {message_text} (ID: {message_id})")
+        # One pass in pydantic-core: JSON parsing and validation together, skipping fields we
+        # do not read
+        body = WebhookData.model_validate_json(raw)
+        
+        # Messages per sender, in delivery order
+        inbox: Dict[str, list] = {}
+        if body.object == "whatsapp_business_account":
+            for entry in body.entry:
+                for change in entry.changes:
+                    if change.field == "messages":
+                        for message in change.value.messages:
+                            from_number = message.from_
+                            message_text = message.text.body
+                            message_id = message.id
                             
                             if from_number and message_text and message_id:
-                                # Process message asynchronously
-                                asyncio.create_task(
-                                    process_whatsapp_message(from_number, message_text, message_id)
-                                )
+                                inbox.setdefault(from_number, []).append((message_text, message_id))
                             else:
-                                print(f"Missing required fields - from: {from_number}, text: {message_text}, id: {message_id}")
+                                logger.warning("Missing required fields - from: %s, text: %s, id: %s", from_number, message_text, message_id)
+        
+        # Process messages asynchronously: one task per sender, so a burst from one user is
+        # answered in order while different users run concurrently
+        for from_number, messages in inbox.items():
+            task = asyncio.create_task(process_whatsapp_messages(from_number, messages))
+            _tasks.add(task)
+            task.add_done_callback(_tasks.discard)
         
-        return JSONResponse({"status": "success"})
+        return {"status": "success"}
         
     except Exception as e:
-        print(f"Error processing webhook: {e}")
+        logger.error("Error processing webhook: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return JSONResponse({
+    return {
         "status": "OK",
         "timestamp": datetime.now().isoformat(),
-        "service": "DaoOS WhatsApp API"
-    })
+        "service": "DaoOS WhatsApp API",
+        "db_pool": pool_status()
+    }
 
 if __name__ == "__main__":
     # Create templates directory if it doesn't exist
     os.makedirs("templates", exist_ok=True)
     os.makedirs("static", exist_ok=True)
     
-    print("Starting DaoOS WhatsApp API Server...")
-    print(f"WhatsApp API URL: {WHATSAPP_API_URL}")
-    print(f"Webhook URL: http://localhost:8000/webhook")
-    print(f"Chat UI: http://localhost:8000")
-    print(f"Health Check: http://localhost:8000/health")
+    logger.info("Starting DaoOS WhatsApp API Server...")
+    logger.info("WhatsApp API URL: %s", WHATSAPP_API_URL)
+    base_url = "http://localhost:8000"
+    logger.info("Webhook URL: %s/webhook", base_url)
+    logger.info("Chat UI: %s", base_url)
+    logger.info("Health Check: %s/health", base_url)
     
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # "auto" picks uvloop and httptools when installed (uvloop has no Windows build). Keep
+    # WEB_CONCURRENCY at 1 unless REDIS_URL is set: without it conversations live in-process
+    uvicorn.run(
+        "whatsapp_server:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="auto",
+        http="auto",
+        workers=int(os.getenv("WEB_CONCURRENCY", 1)),
+        log_level="warning",
+    )